@@ -1,3 +1,5 @@
+from typing import Any, Callable, List, Tuple
+
 import pytest
 
 import jsonurl_py as jsonurl
@@ -23,3 +25,57 @@ def assert_roundtrip_data(data, **kw):
     text_dump = jsonurl.dumps(data, **kw)
     data_load = jsonurl.loads(text_dump, **kw)
     assert data_load == data
+
+
+MEMORY_REPORT: List[Tuple[str, int, int, int]] = []
+"""Rows of (test name, text length, peak bytes, retained bytes)"""
+
+
+def measure_memory(func: Callable[[], Any]) -> Tuple[Any, int, int]:
+    """Call func under tracemalloc and return (result, peak, retained) bytes
+
+    Retained bytes are those still allocated when func returns, mostly the result.
+    """
+    # Not at the top, PyPy has no tracemalloc
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak - base, current - base
+
+
+def pytest_collection_modifyitems(config, items):
+    # Benchmarks are slow, only run them when asked for like tox -e bench does
+    if config.getoption("benchmark_only", False):
+        return
+    if config.getoption("benchmark_enable", False):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmark-only")
+    for item in items:
+        if "benchmark" in getattr(item, "fixturenames", ()):
+            item.add_marker(skip)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_benchmark_update_machine_info(config, machine_info):
+    # Saved runs of the pure Python and mypyc builds can be told apart
+    machine_info["jsonurl_py_compiled"] = jsonurl.COMPILED
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not MEMORY_REPORT:
+        return
+    terminalreporter.section("memory")
+    terminalreporter.write_line(
+        f"{'name':<60} {'length':>8} {'peak':>10} {'retained':>10} {'peak/len':>8}"
+    )
+    for name, length, peak, retained in MEMORY_REPORT:
+        terminalreporter.write_line(
+            f"{name:<60} {length:>8} {peak:>10} {retained:>10} "
+            f"{peak / max(length, 1):>8.1f}"
+        )
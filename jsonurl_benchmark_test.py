@@ -1,8 +1,16 @@
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Callable, Dict, Sequence
+
 import pytest
 
 pytest.importorskip("pytest_benchmark")
 import jsonurl_py as jsonurl
 from conftest import assert_roundtrip_data
+from jsonurl_corpus import corpus_ids, make_document
 
 BENCHMARK_DATA = {
     "a": 1,
@@ -83,3 +91,576 @@ def test_dumps(benchmark, aqf: bool):
     text = benchmark(lambda: jsonurl.dumps(BENCHMARK_DATA, aqf=aqf))
     data = jsonurl.loads(text, aqf=aqf)
     assert data == BENCHMARK_DATA
+
+
+OPTION_SETS = {
+    "default": {},
+    "aqf": {"aqf": True},
+    "implied": {"implied": True},
+    "aqf-implied": {"aqf": True, "implied": True},
+    "distinguish": {"distinguish_empty_list_dict": True},
+}
+"""Option combinations benchmarked for each corpus document
+
+The ``implied`` pseudo-option becomes implied_list or implied_dict based on the
+type of the document.
+"""
+
+BENCHMARK_FULL = bool(os.environ.get("JSONURL_BENCHMARK_FULL"))
+"""Benchmark all sizes and options, otherwise just medium size with defaults
+
+The full matrix takes several minutes, use ``tox -e bench`` to run it.
+"""
+
+BENCHMARK_DOC_IDS = [
+    doc_id for doc_id in corpus_ids() if BENCHMARK_FULL or doc_id.endswith("-medium")
+]
+BENCHMARK_OPTION_SETS = list(OPTION_SETS) if BENCHMARK_FULL else ["default"]
+
+
+def _corpus_case(doc_id: str, opt_name: str):
+    shape, size = doc_id.split("-")
+    data = make_document(shape, size)
+    kw = dict(OPTION_SETS[opt_name])
+    if kw.pop("implied", False):
+        if isinstance(data, dict):
+            kw["implied_dict"] = True
+        elif isinstance(data, list):
+            kw["implied_list"] = True
+    return data, kw
+
+
+@pytest.mark.parametrize("opt_name", OPTION_SETS)
+@pytest.mark.parametrize("doc_id", corpus_ids())
+def test_corpus_roundtrip(doc_id: str, opt_name: str):
+    data, kw = _corpus_case(doc_id, opt_name)
+    assert_roundtrip_data(data, **kw)
+
+
+@pytest.mark.parametrize("opt_name", BENCHMARK_OPTION_SETS)
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_loads(benchmark, doc_id: str, opt_name: str):
+    data, kw = _corpus_case(doc_id, opt_name)
+    text = jsonurl.dumps(data, **kw)
+    benchmark.group = f"loads-{doc_id}"
+    benchmark.extra_info["text_length"] = len(text)
+    assert benchmark(jsonurl.loads, text, **kw) == data
+
+
+@pytest.mark.parametrize("opt_name", BENCHMARK_OPTION_SETS)
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_dumps(benchmark, doc_id: str, opt_name: str):
+    data, kw = _corpus_case(doc_id, opt_name)
+    benchmark.group = f"dumps-{doc_id}"
+    text = benchmark(jsonurl.dumps, data, **kw)
+    benchmark.extra_info["text_length"] = len(text)
+    assert jsonurl.loads(text, **kw) == data
+
+
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_json_loads(benchmark, doc_id: str):
+    """Baseline: stdlib json on the same document"""
+    data, _ = _corpus_case(doc_id, "default")
+    text = json.dumps(data)
+    benchmark.group = f"loads-{doc_id}"
+    benchmark.extra_info["text_length"] = len(text)
+    assert benchmark(json.loads, text) == data
+
+
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_json_dumps(benchmark, doc_id: str):
+    """Baseline: stdlib json on the same document"""
+    data, _ = _corpus_case(doc_id, "default")
+    benchmark.group = f"dumps-{doc_id}"
+    text = benchmark(json.dumps, data)
+    benchmark.extra_info["text_length"] = len(text)
+
+
+@pytest.mark.parametrize("collect", [False, True])
+def test_loads_stats_overhead(benchmark, collect: bool):
+    text = jsonurl.dumps(BENCHMARK_DATA)
+    benchmark.group = "loads-stats"
+    stats = jsonurl.Stats() if collect else None
+    assert benchmark(jsonurl.loads, text, stats=stats) == BENCHMARK_DATA
+
+
+@pytest.mark.parametrize("collect", [False, True])
+def test_dumps_stats_overhead(benchmark, collect: bool):
+    benchmark.group = "dumps-stats"
+    stats = jsonurl.Stats() if collect else None
+    text = benchmark(jsonurl.dumps, BENCHMARK_DATA, stats=stats)
+    assert jsonurl.loads(text) == BENCHMARK_DATA
+
+
+def _load_replay_records():
+    path = os.environ.get("JSONURL_BENCHMARK_REPLAY")
+    if not path:
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+REPLAY_RECORDS = _load_replay_records()
+"""Calls captured by `SlowCall.replay_record`, one JSON object per line"""
+
+
+def _replay_loads(text: str, opts: jsonurl.LoadOpts):
+    try:
+        return jsonurl.loads(text, opts)
+    except jsonurl.ParseError:
+        return None
+
+
+@pytest.mark.parametrize("index", range(len(REPLAY_RECORDS)))
+def test_replay(benchmark, index: int):
+    record = REPLAY_RECORDS[index]
+    if record["truncated"]:
+        pytest.skip("Captured text was truncated")
+    benchmark.group = "replay"
+    benchmark.extra_info["captured_duration"] = record["duration"]
+    load_fields = {f.name for f in dataclasses.fields(jsonurl.LoadOpts)}
+    load_opts = jsonurl.LoadOpts(
+        **{k: v for k, v in record["opts"].items() if k in load_fields}
+    )
+    if record["func"] == "loads":
+        benchmark(_replay_loads, record["text"], load_opts)
+    else:
+        data = jsonurl.loads(record["text"], load_opts)
+        benchmark(jsonurl.dumps, data, jsonurl.DumpOpts(**record["opts"]))
+
+
+# Extension modules can't be run with -m, call main like the console script
+if jsonurl.COMPILED:
+    _MAIN = ["-c", "import jsonurl_py; jsonurl_py.main()"]
+else:
+    _MAIN = ["-m", "jsonurl_py"]
+
+STARTUP_COMMANDS = {
+    "python": ["-c", "pass"],
+    "import": ["-c", "import jsonurl_py"],
+    "cli-load": _MAIN + ["load"],
+    "cli-dump": _MAIN + ["dump"],
+}
+"""Process spawn timings, the bare interpreter is a baseline"""
+
+
+@pytest.mark.parametrize("name", STARTUP_COMMANDS)
+def test_startup(benchmark, name: str):
+    benchmark.group = "startup"
+    args = [sys.executable] + STARTUP_COMMANDS[name]
+    input = '{"a": [1, 2]}' if name == "cli-dump" else "(a:(1,2))"
+    benchmark.pedantic(
+        subprocess.run,
+        args=(args,),
+        kwargs=dict(input=input, text=True, check=True, capture_output=True),
+        rounds=20,
+    )
+
+
+@pytest.mark.parametrize("opt_name", BENCHMARK_OPTION_SETS)
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_validate(benchmark, doc_id: str, opt_name: str):
+    data, kw = _corpus_case(doc_id, opt_name)
+    text = jsonurl.dumps(data, **kw)
+    benchmark.group = f"loads-{doc_id}"
+    benchmark(jsonurl.validate, text, **kw)
+
+
+LIMIT_OPTS = jsonurl.LoadOpts(
+    max_input_length=10**6, max_depth=100, max_items=10**4, max_string_length=1000
+)
+"""Generous limits that normal documents stay well within"""
+
+
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_loads_limits(benchmark, doc_id: str):
+    """Cost of limit checks on input that passes them, compare with loads"""
+    data, _ = _corpus_case(doc_id, "default")
+    text = jsonurl.dumps(data)
+    benchmark.group = f"loads-{doc_id}"
+    assert benchmark(jsonurl.loads, text, LIMIT_OPTS) == data
+
+
+REJECT_TEXTS = {
+    "wide": "(" + ",".join(["a"] * 10**5) + ")",
+    "deep": "(" * 150 + "a" + ")" * 150,
+}
+"""Hostile input that `LIMIT_OPTS` rejects"""
+
+
+def _reject_loads(text: str, opts: jsonurl.LoadOpts):
+    try:
+        return jsonurl.loads(text, opts)
+    except jsonurl.ParseError:
+        return None
+
+
+@pytest.mark.parametrize("limits", [False, True])
+@pytest.mark.parametrize("name", REJECT_TEXTS)
+def test_reject(benchmark, name: str, limits: bool):
+    benchmark.group = f"reject-{name}"
+    opts = LIMIT_OPTS if limits else jsonurl.LoadOpts()
+    result = benchmark(_reject_loads, REJECT_TEXTS[name], opts)
+    assert (result is None) == limits
+
+
+def _zipf_workload(distinct: int, count: int, s: float = 1.1):
+    """Query strings drawn with Zipf-distributed popularity"""
+    import random
+
+    texts = [
+        jsonurl.dumps(make_document("query", "small", seed), implied_dict=True)
+        for seed in range(distinct)
+    ]
+    weights = [1 / (rank**s) for rank in range(1, distinct + 1)]
+    return random.Random(0).choices(texts, weights, k=count)
+
+
+@pytest.fixture(scope="session")
+def zipf_texts():
+    return _zipf_workload(5000, 2000)
+
+
+ZIPF_OPTS = jsonurl.LoadOpts(implied_dict=True)
+
+
+def _loads_all(loads, texts, opts):
+    for text in texts:
+        loads(text, opts)
+
+
+@pytest.mark.parametrize("maxsize", [0, 100, 1000])
+def test_zipf_cache(benchmark, zipf_texts, maxsize: int):
+    """Repeated query strings, maxsize 0 is uncached loads"""
+    benchmark.group = "loads-zipf"
+    if maxsize:
+        cache = jsonurl.LoadsCache(maxsize=maxsize)
+        benchmark(_loads_all, cache.loads, zipf_texts, ZIPF_OPTS)
+        benchmark.extra_info["hit_rate"] = cache.hit_rate
+    else:
+        benchmark(_loads_all, jsonurl.loads, zipf_texts, ZIPF_OPTS)
+
+
+def _loads_then_freeze(text: str):
+    return jsonurl.freeze(jsonurl.loads(text))
+
+
+@pytest.mark.parametrize("mode", ["plain", "frozen", "freeze-pass"])
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_loads_frozen(benchmark, doc_id: str, mode: str):
+    """Frozen output built directly versus a separate freeze pass"""
+    data, _ = _corpus_case(doc_id, "default")
+    text = jsonurl.dumps(data)
+    benchmark.group = f"loads-frozen-{doc_id}"
+    if mode == "plain":
+        benchmark(jsonurl.loads, text)
+    elif mode == "frozen":
+        benchmark(jsonurl.loads, text, frozen=True)
+    else:
+        benchmark(_loads_then_freeze, text)
+
+
+@pytest.fixture(scope="session")
+def sparse_text():
+    """Large list of records where each request reads a few fields"""
+    return jsonurl.dumps(make_document("records", "large"))
+
+
+def _sparse_loads(text: str):
+    data = jsonurl.loads(text)
+    return [data[i]["name"] for i in range(0, 1000, 100)]
+
+
+def _sparse_lazy(text: str):
+    data = jsonurl.loads_lazy(text)
+    return [data[i]["name"] for i in range(0, 1000, 100)]
+
+
+def _sparse_lazy_reuse(data):
+    return [data[i]["name"] for i in range(0, 1000, 100)]
+
+
+@pytest.mark.parametrize("mode", ["loads", "lazy", "lazy-reuse", "index"])
+def test_sparse_access(benchmark, sparse_text, mode: str):
+    """Read 10 fields out of 1000 records"""
+    benchmark.group = "loads-sparse"
+    benchmark.extra_info["text_length"] = len(sparse_text)
+    if mode == "loads":
+        benchmark(_sparse_loads, sparse_text)
+    elif mode == "lazy":
+        benchmark(_sparse_lazy, sparse_text)
+    elif mode == "lazy-reuse":
+        benchmark(_sparse_lazy_reuse, jsonurl.loads_lazy(sparse_text))
+    else:
+        benchmark(jsonurl.StructuralIndex, sparse_text, jsonurl.LoadOpts())
+
+
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_loads_tape(benchmark, doc_id: str):
+    """Parse time of the tape representation, compare with loads"""
+    data, _ = _corpus_case(doc_id, "default")
+    text = jsonurl.dumps(data)
+    benchmark.group = f"loads-{doc_id}"
+    tape = benchmark(jsonurl.loads_tape, text)
+    benchmark.extra_info["tape_entries"] = len(tape.tags)
+
+
+def _canonicalize_roundtrip(text: str, opts: jsonurl.LoadOpts):
+    return jsonurl.dumps(jsonurl.loads(text, opts), sort_keys=True)
+
+
+@pytest.mark.parametrize("single_pass", [False, True])
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_canonicalize(benchmark, doc_id: str, single_pass: bool):
+    """canonicalize versus dumps(loads(text), sort_keys=True)"""
+    data, _ = _corpus_case(doc_id, "default")
+    text = jsonurl.dumps(data)
+    opts = jsonurl.LoadOpts()
+    benchmark.group = f"canonicalize-{doc_id}"
+    func = jsonurl.canonicalize if single_pass else _canonicalize_roundtrip
+    assert benchmark(func, text, opts) == _canonicalize_roundtrip(text, opts)
+
+
+@pytest.fixture(scope="session")
+def pagination_text():
+    """Large query with the pagination fields first, as in our links"""
+    data = dict(page=1, cursor="abc", **make_document("query", "large"))
+    return jsonurl.dumps(data, implied_dict=True)
+
+
+def _replace_roundtrip(text: str, key: str, value):
+    data = jsonurl.loads(text, implied_dict=True)
+    data[key] = value
+    return jsonurl.dumps(data, implied_dict=True)
+
+
+def _replace_splice(text: str, key: str, value):
+    return jsonurl.replace_at(text, [key], value, implied_dict=True)
+
+
+@pytest.mark.parametrize("splice", [False, True])
+@pytest.mark.parametrize("key", ["page", "cursor"])
+def test_replace_at(benchmark, pagination_text, key: str, splice: bool):
+    benchmark.group = f"replace-{key}"
+    func = _replace_splice if splice else _replace_roundtrip
+    text = benchmark(func, pagination_text, key, "xyz")
+    assert jsonurl.loads(text, implied_dict=True)[key] == "xyz"
+
+
+URL_LIMIT = 2000
+"""Number of records that fit in a URL of this length"""
+
+
+def _fit_retry(rows):
+    count = len(rows)
+    while len(jsonurl.dumps(rows[:count])) > URL_LIMIT:
+        count -= 1
+    return count
+
+
+def _fit_bisect(rows, fits):
+    low, high = 0, len(rows)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if fits(rows[:mid]):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _fits_length(rows):
+    return jsonurl.encoded_length(rows) <= URL_LIMIT
+
+
+def _fits_max_length(rows):
+    try:
+        jsonurl.dumps(rows, max_length=URL_LIMIT)
+        return True
+    except jsonurl.MaxLengthError:
+        return False
+
+
+@pytest.mark.parametrize("mode", ["retry", "encoded_length", "max_length"])
+def test_fit_url_limit(benchmark, mode: str):
+    benchmark.group = "fit-url"
+    rows = make_document("records", "medium")
+    if mode == "retry":
+        count = benchmark(_fit_retry, rows)
+    elif mode == "encoded_length":
+        count = benchmark(_fit_bisect, rows, _fits_length)
+    else:
+        count = benchmark(_fit_bisect, rows, _fits_max_length)
+    assert count == _fit_retry(rows)
+
+
+@pytest.fixture(scope="session")
+def bulk_text():
+    """Bulk import payload with 20k records"""
+    rows = [
+        row for seed in range(20) for row in make_document("records", "large", seed)
+    ]
+    return jsonurl.dumps(rows, implied_list=True)
+
+
+@pytest.fixture(scope="session")
+def process_pool():
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(os.cpu_count()) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4, 8])
+def test_loads_parallel(benchmark, bulk_text, process_pool, workers: int):
+    """Bulk implied list by worker count, 1 is the serial parser"""
+    if workers > (os.cpu_count() or 1):
+        pytest.skip("Not enough CPUs")
+    benchmark.group = "loads-parallel"
+    benchmark.extra_info["text_length"] = len(bulk_text)
+    result = benchmark.pedantic(
+        jsonurl.loads_parallel,
+        args=(bulk_text,),
+        kwargs=dict(implied_list=True, workers=workers, executor=process_pool),
+        rounds=5,
+    )
+    assert len(result) == 20000
+
+
+HOMOGENEOUS_SIZES = [10000, 100000, 1000000] if BENCHMARK_FULL else [10000]
+HOMOGENEOUS_KINDS: Dict[str, Callable[[int], Sequence[Any]]] = {
+    "int": lambda size: list(range(size)),
+    "float": lambda size: [i / 8 for i in range(size)],
+    "str": lambda size: [f"tag{i}" for i in range(size)],
+    "range": range,
+}
+
+
+@pytest.mark.parametrize("baseline", [False, True])
+@pytest.mark.parametrize("size", HOMOGENEOUS_SIZES)
+@pytest.mark.parametrize("kind", HOMOGENEOUS_KINDS)
+def test_dumps_homogeneous(benchmark, kind: str, size: int, baseline: bool):
+    """Long lists of a single atom type, compare with json.dumps"""
+    data = HOMOGENEOUS_KINDS[kind](size)
+    benchmark.group = f"dumps-homogeneous-{kind}-{size}"
+    if baseline:
+        benchmark(json.dumps, list(data))
+    else:
+        text = benchmark(jsonurl.dumps, data)
+        assert jsonurl.loads(text) == list(data)
+
+
+def _numpy_roundtrip_lists(data):
+    import numpy
+
+    return numpy.array(jsonurl.loads(jsonurl.dumps(data.tolist())))
+
+
+def _numpy_roundtrip_direct(data):
+    return jsonurl.loads(jsonurl.dumps(data), numpy_dtype=data.dtype)
+
+
+@pytest.mark.parametrize("direct", [False, True])
+@pytest.mark.parametrize("dtype", ["int64", "float64"])
+def test_numpy_roundtrip(benchmark, dtype: str, direct: bool):
+    """Vector of 10k numbers via lists or with numpy support"""
+    numpy = pytest.importorskip("numpy")
+    data = numpy.linspace(-1e6, 1e6, 10000).astype(dtype)
+    benchmark.group = f"numpy-{dtype}"
+    func = _numpy_roundtrip_direct if direct else _numpy_roundtrip_lists
+    assert numpy.array_equal(benchmark(func, data), data)
+
+
+LINK_SHAPE = {
+    "filter": {"status": jsonurl.Slot("status"), "owner": jsonurl.Slot("owner")},
+    "fields": ["id", "name", "status", "owner", "updated"],
+    "page": jsonurl.Slot("page"),
+}
+LINK_VALUES = [
+    dict(status=status, owner=f"user{i}", page=i % 10)
+    for i in range(1000)
+    for status in ["open", "closed"]
+]
+
+
+def _links_dumps(values):
+    fields = LINK_SHAPE["fields"]
+    return [
+        jsonurl.dumps(
+            {
+                "filter": {"status": v["status"], "owner": v["owner"]},
+                "fields": fields,
+                "page": v["page"],
+            },
+            implied_dict=True,
+        )
+        for v in values
+    ]
+
+
+def _links_template(values):
+    template = jsonurl.compile_template(LINK_SHAPE, implied_dict=True)
+    return [template(**v) for v in values]
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_link_generation(benchmark, compiled: bool):
+    """2000 links of the same shape, the template is compiled in each round"""
+    benchmark.group = "link-generation"
+    func = _links_template if compiled else _links_dumps
+    assert benchmark(func, LINK_VALUES) == _links_dumps(LINK_VALUES)
+
+
+UNICODE_DOC_IDS = [
+    doc_id for doc_id in BENCHMARK_DOC_IDS if doc_id.startswith("unicode")
+]
+
+
+@pytest.mark.parametrize("iri", [False, True])
+@pytest.mark.parametrize("doc_id", UNICODE_DOC_IDS)
+def test_unicode_dumps_iri(benchmark, doc_id: str, iri: bool):
+    """Percent-encoding versus literal non-ASCII, output size in extra_info"""
+    data, _ = _corpus_case(doc_id, "default")
+    benchmark.group = f"iri-dumps-{doc_id}"
+    text = benchmark(jsonurl.dumps, data, iri=iri)
+    benchmark.extra_info["text_length"] = len(text)
+    benchmark.extra_info["utf8_length"] = len(text.encode())
+
+
+@pytest.mark.parametrize("iri", [False, True])
+@pytest.mark.parametrize("doc_id", UNICODE_DOC_IDS)
+def test_unicode_loads_iri(benchmark, doc_id: str, iri: bool):
+    data, _ = _corpus_case(doc_id, "default")
+    text = jsonurl.dumps(data, iri=iri)
+    benchmark.group = f"iri-loads-{doc_id}"
+    assert benchmark(jsonurl.loads, text, iri=iri) == data
+
+
+@pytest.mark.parametrize("minimize", [False, True])
+@pytest.mark.parametrize("opt_name", ["default", "aqf"])
+@pytest.mark.parametrize("doc_id", BENCHMARK_DOC_IDS)
+def test_corpus_dumps_minimize(benchmark, doc_id: str, opt_name: str, minimize: bool):
+    """Output size saved by minimize is in extra_info"""
+    data, kw = _corpus_case(doc_id, opt_name)
+    benchmark.group = f"minimize-{doc_id}-{opt_name}"
+    text = benchmark(jsonurl.dumps, data, minimize=minimize, **kw)
+    benchmark.extra_info["text_length"] = len(text)
+    benchmark.extra_info["saved"] = len(jsonurl.dumps(data, **kw)) - len(text)
+
+
+LONG_STRINGS = {
+    "plain": "abc" * 30000,
+    "spaces": "a b " * 20000,
+    "percent": "été " * 20000,
+    "escapes": "a,b:(c)!" * 10000,
+}
+"""Single long strings, decoding them should stay linear also on PyPy"""
+
+
+@pytest.mark.parametrize("aqf", [False, True])
+@pytest.mark.parametrize("kind", LONG_STRINGS)
+def test_loads_long_string(benchmark, kind: str, aqf: bool):
+    data = [LONG_STRINGS[kind]]
+    text = jsonurl.dumps(data, aqf=aqf)
+    benchmark.group = f"loads-long-string-{kind}"
+    assert benchmark(jsonurl.loads, text, aqf=aqf) == data
@@ -0,0 +1,155 @@
+"""
+Synthetic documents for benchmarking jsonurl_py
+
+Documents are generated deterministically from a seed so that results can be
+compared between runs. They never contain empty lists or dicts so they
+roundtrip with and without ``distinguish_empty_list_dict``.
+"""
+
+import random
+import string
+from typing import Any, Callable, Dict, List
+
+CORPUS_SIZES = {
+    "small": 10,
+    "medium": 100,
+    "large": 1000,
+}
+"""Scale factor for each size name, roughly the number of leaf values"""
+
+_WORD_CHARS = string.ascii_lowercase + string.digits
+_UNICODE_WORDS = [
+    "我能吞下玻璃",
+    "أنا قادر",
+    "Я могу",
+    "héllo wörld",
+    "naïve café",
+    "€100 & £50",
+    "emoji 🙂",
+]
+_AQF_WORDS = [
+    "a!b",
+    "(paren)",
+    "x,y",
+    "k:v",
+    "!",
+    "true",
+    "123",
+    "1e5",
+    "",
+    "f(a,b):c!",
+]
+
+
+def _word(rnd: random.Random) -> str:
+    return "".join(rnd.choice(_WORD_CHARS) for _ in range(rnd.randint(3, 10)))
+
+
+def _scalar(rnd: random.Random) -> Any:
+    kind = rnd.randrange(6)
+    if kind == 0:
+        return rnd.randint(-1000, 1000)
+    if kind == 1:
+        return round(rnd.uniform(-1000, 1000), 3)
+    if kind == 2:
+        return rnd.choice([True, False, None])
+    return _word(rnd)
+
+
+_MAX_DEEP = 200
+"""Nesting cap for `gen_deep`, the recursive parser would hit the recursion limit"""
+
+
+def gen_deep(n: int, rnd: random.Random) -> Any:
+    """Chain of alternating dicts and lists nested n levels deep"""
+    ret: Any = _word(rnd)
+    for i in range(min(n, _MAX_DEEP)):
+        if i % 2:
+            ret = [_scalar(rnd), ret]
+        else:
+            ret = {_word(rnd): ret, "n": i}
+    return ret
+
+
+def gen_wide(n: int, rnd: random.Random) -> Any:
+    """Single dict with many scalar items"""
+    return {f"{_word(rnd)}{i}": _scalar(rnd) for i in range(n)}
+
+
+def gen_records(n: int, rnd: random.Random) -> Any:
+    """List of uniform records, like rows from a table"""
+    return [
+        {
+            "id": i,
+            "name": _word(rnd),
+            "score": round(rnd.random() * 100, 2),
+            "active": rnd.random() < 0.5,
+            "tags": [_word(rnd) for _ in range(rnd.randint(1, 3))],
+        }
+        for i in range(n)
+    ]
+
+
+def gen_numeric(n: int, rnd: random.Random) -> Any:
+    """Lists of ints and floats"""
+    return {
+        "ids": [rnd.randint(0, 10**9) for _ in range(n)],
+        "coords": [rnd.uniform(-180, 180) for _ in range(n)],
+        "exp": [rnd.uniform(0, 1) * 10.0 ** rnd.randint(-30, 30) for _ in range(n)],
+    }
+
+
+def gen_unicode(n: int, rnd: random.Random) -> Any:
+    """Strings needing heavy percent-encoding"""
+    return [
+        rnd.choice(_UNICODE_WORDS) + " " + rnd.choice(_UNICODE_WORDS) for _ in range(n)
+    ]
+
+
+def gen_aqf_escape(n: int, rnd: random.Random) -> Any:
+    """Strings full of structural characters and keyword/number look-alikes"""
+    return {
+        f"{rnd.choice(_AQF_WORDS)}:{i}": [
+            rnd.choice(_AQF_WORDS) for _ in range(rnd.randint(1, 4))
+        ]
+        for i in range(n)
+    }
+
+
+def gen_query(n: int, rnd: random.Random) -> Any:
+    """Flat dict shaped like a query string, meant for implied_dict"""
+    ret: Dict[str, Any] = {}
+    for i in range(n):
+        kind = i % 4
+        key = f"{_word(rnd)}_{i}"
+        if kind == 0:
+            ret[key] = _word(rnd)
+        elif kind == 1:
+            ret[key] = rnd.randint(0, 1000)
+        elif kind == 2:
+            ret[key] = [_word(rnd) for _ in range(rnd.randint(1, 4))]
+        else:
+            ret[key] = {"op": rnd.choice(["eq", "lt", "gt"]), "value": _scalar(rnd)}
+    return ret
+
+
+CORPUS_SHAPES: Dict[str, Callable[[int, random.Random], Any]] = {
+    "deep": gen_deep,
+    "wide": gen_wide,
+    "records": gen_records,
+    "numeric": gen_numeric,
+    "unicode": gen_unicode,
+    "aqf_escape": gen_aqf_escape,
+    "query": gen_query,
+}
+"""Document generators by shape name"""
+
+
+def make_document(shape: str, size: str, seed: int = 0) -> Any:
+    """Generate the document for one shape and size name"""
+    return CORPUS_SHAPES[shape](CORPUS_SIZES[size], random.Random(seed))
+
+
+def corpus_ids() -> List[str]:
+    """All ``shape-size`` combinations"""
+    return [f"{shape}-{size}" for shape in CORPUS_SHAPES for size in CORPUS_SIZES]
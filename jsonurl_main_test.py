@@ -1,6 +1,17 @@
+import os
 import subprocess
 import sys
 
+import pytest
+
+import jsonurl_py
+
+# Extension modules can't be run with -m, call main like the console script
+if jsonurl_py.COMPILED:
+    MAIN = ["-c", "import jsonurl_py; jsonurl_py.main()"]
+else:
+    MAIN = ["-m", "jsonurl_py"]
+
 
 def run(
     argv,
@@ -10,7 +21,7 @@ def run(
     **kw,
 ) -> subprocess.CompletedProcess:
     return subprocess.run(
-        [sys.executable, "-m", "jsonurl_py"] + argv,
+        [sys.executable] + MAIN + argv,
         text=text,
         check=check,
         capture_output=True,
@@ -56,3 +67,85 @@ def test_main_dump_dict():
 def test_main_dump_aqf():
     proc = run(["dump", "-a"], input='["a", "1", "true"]')
     assert proc.stdout == "(a,!1,!true)\n"
+
+
+def test_main_load_indent():
+    assert run(["load", "--indent", "1"], input="(a)").stdout == '[\n "a"\n]\n'
+    assert run(["load", "--indent=1", "-l"], input="a").stdout == '[\n "a"\n]\n'
+
+
+def test_main_argparse_fallback():
+    proc = run(["load", "-la"], input="a,!1")
+    assert proc.stdout == '["a", "1"]\n'
+    proc = run(["dump", "--indent", "1"], check=False)
+    assert proc.returncode == 2 and "unrecognized arguments" in proc.stderr
+    assert "usage:" in run(["--help"]).stdout
+
+
+needs_importtime = pytest.mark.skipif(
+    sys.implementation.name == "pypy", reason="PyPy does not support -X importtime"
+)
+
+
+def import_times(code: str, **kw) -> list:
+    """Run code with ``-X importtime`` and return (name, self, cumulative)"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        text=True,
+        check=True,
+        capture_output=True,
+        **kw,
+    )
+    # lines look like "import time: self [us] | cumulative | imported package"
+    ret = []
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "[us]" not in line:
+            self_us, cumulative_us, name = line[12:].split("|")
+            ret.append((name.strip(), int(self_us), int(cumulative_us)))
+    return ret
+
+
+@needs_importtime
+def test_import_lazy():
+    """Importing the module should not import slow or CLI-only modules"""
+    imported = {name for name, _, _ in import_times("import jsonurl_py")}
+    assert "jsonurl_py" in imported
+    for name in ["argparse", "json", "urllib.parse"]:
+        assert name not in imported
+
+
+@needs_importtime
+def test_import_budget(tmp_path):
+    """Importing the module should cost little on top of dataclasses and typing
+
+    The option classes are public dataclasses so dataclasses, and the re and
+    inspect modules it imports, are a fixed cost. So is typing for annotations
+    that `typing.get_type_hints` can resolve. Everything else done at
+    import time is budgeted against that so it does not creep back up.
+    """
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=str(tmp_path))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    code = "import dataclasses, typing, jsonurl_py"
+    # first run writes bytecode
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    allowed = {"__future__", "jsonurl_py"}
+    if jsonurl_py.COMPILED:
+        allowed.add("mypy_extensions")
+    own = []
+    base = []
+    for _ in range(7):
+        times = import_times(code, env=env)
+        names = [name for name, _, _ in times]
+        own_imports = names[names.index("typing") + 1 :]
+        assert set(own_imports) <= allowed
+        cumulative = dict((name, cum) for name, _, cum in times)
+        own.append(cumulative["jsonurl_py"])
+        base.append(cumulative["dataclasses"] + cumulative["typing"])
+    assert min(own) < 0.3 * min(base)
+
+
+def test_main_iri():
+    proc = run(["dump", "--iri", "-d"], input='{"a": "\\u6211 b"}', encoding="utf-8")
+    assert proc.stdout == "a:\u6211+b\n"
+    proc = run(["load", "-i"], input="(\u6211)", encoding="utf-8")
+    assert proc.stdout == '["\\u6211"]\n'
@@ -0,0 +1,124 @@
+"""
+Memory footprint of loads and dumps measured with tracemalloc
+
+Peak usage is checked against a budget proportional to the length of the
+jsonurl text so that regressions fail like any other test. A full report is
+printed in the "memory" section of the terminal summary.
+"""
+
+import sys
+
+import pytest
+
+import jsonurl_py as jsonurl
+from conftest import MEMORY_REPORT, measure_memory
+from jsonurl_corpus import corpus_ids, make_document
+
+if sys.implementation.name == "pypy":
+    pytest.skip("PyPy has no tracemalloc or sys.getsizeof", allow_module_level=True)
+
+LOADS_PEAK_BUDGET = 32
+"""Maximum peak bytes allocated by loads per byte of input text"""
+
+DUMPS_PEAK_BUDGET = 96
+"""Maximum peak bytes allocated by dumps per byte of output text
+
+Deeply nested documents are expensive because each level joins a new string.
+"""
+
+BUDGET_SLACK = 8192
+"""Fixed allowance so that tiny documents are not dominated by overhead"""
+
+
+def _check(name: str, length: int, peak: int, retained: int, budget: int):
+    MEMORY_REPORT.append((name, length, peak, retained))
+    assert peak <= budget * length + BUDGET_SLACK
+
+
+@pytest.mark.parametrize("aqf", [False, True])
+@pytest.mark.parametrize("doc_id", corpus_ids())
+def test_loads_memory(request, doc_id: str, aqf: bool):
+    shape, size = doc_id.split("-")
+    data = make_document(shape, size)
+    text = jsonurl.dumps(data, aqf=aqf)
+    result, peak, retained = measure_memory(lambda: jsonurl.loads(text, aqf=aqf))
+    assert result == data
+    _check(request.node.name, len(text), peak, retained, LOADS_PEAK_BUDGET)
+
+
+@pytest.mark.parametrize("aqf", [False, True])
+@pytest.mark.parametrize("doc_id", corpus_ids())
+def test_dumps_memory(request, doc_id: str, aqf: bool):
+    shape, size = doc_id.split("-")
+    data = make_document(shape, size)
+    text, peak, retained = measure_memory(lambda: jsonurl.dumps(data, aqf=aqf))
+    _check(request.node.name, len(text), peak, retained, DUMPS_PEAK_BUDGET)
+
+
+def _sizeof_containers(arg) -> int:
+    """Total size of nested lists and dicts, tracemalloc does not see free lists"""
+    if isinstance(arg, (list, tuple)):
+        return sys.getsizeof(arg) + sum(_sizeof_containers(x) for x in arg)
+    if isinstance(arg, dict):
+        return sys.getsizeof(arg) + sum(_sizeof_containers(x) for x in arg.values())
+    return 0
+
+
+@pytest.mark.parametrize("doc_id", corpus_ids())
+def test_loads_frozen_memory(request, doc_id: str):
+    """Frozen output is never larger than lists and dicts"""
+    shape, size = doc_id.split("-")
+    data = make_document(shape, size)
+    text = jsonurl.dumps(data)
+    plain = jsonurl.loads(text)
+    result, peak, retained = measure_memory(lambda: jsonurl.loads(text, frozen=True))
+    assert result == jsonurl.freeze(data)
+    _check(request.node.name, len(text), peak, retained, LOADS_PEAK_BUDGET)
+    assert _sizeof_containers(result) <= _sizeof_containers(plain)
+
+
+@pytest.mark.parametrize("doc_id", corpus_ids())
+def test_loads_tape_memory(request, doc_id: str):
+    """Tape output is smaller than lists and dicts, except for tiny documents"""
+    shape, size = doc_id.split("-")
+    data = make_document(shape, size)
+    text = jsonurl.dumps(data)
+    _, _, tree = measure_memory(lambda: jsonurl.loads(text))
+    tape, peak, retained = measure_memory(lambda: jsonurl.loads_tape(text))
+    assert tape.to_python() == data
+    _check(request.node.name, len(text), peak, retained, LOADS_PEAK_BUDGET)
+    if size != "small":
+        assert retained < tree
+
+
+def _iterdumps_rows(count: int) -> int:
+    rows = ({"id": i, "name": f"row {i}", "tags": ["a", "b"]} for i in range(count))
+    return sum(len(piece) for piece in jsonurl.iterdumps(rows, implied_list=True))
+
+
+def test_iterdumps_memory(request):
+    """Peak memory of streaming a generator does not grow with its length"""
+    small_length, small_peak, _ = measure_memory(lambda: _iterdumps_rows(100))
+    large_length, large_peak, _ = measure_memory(lambda: _iterdumps_rows(10000))
+    MEMORY_REPORT.append((request.node.name + "[100]", small_length, small_peak, 0))
+    MEMORY_REPORT.append((request.node.name + "[10000]", large_length, large_peak, 0))
+    assert large_peak < 2 * small_peak + BUDGET_SLACK
+
+
+def _repetitive_query(columns: int) -> dict:
+    """UI query with the same filter clause on many columns"""
+    clause = {"op": "in", "values": ["open", "pending", "blocked"], "negate": False}
+    return {"columns": {f"col{i}": {"filter": clause} for i in range(columns)}}
+
+
+@pytest.mark.parametrize("columns", [10, 1000])
+def test_loads_dedup_memory(request, columns: int):
+    """Shared repeated clauses retain less than separate frozen copies"""
+    text = jsonurl.dumps(_repetitive_query(columns))
+    _, _, frozen = measure_memory(lambda: jsonurl.loads(text, frozen=True))
+    result, peak, retained = measure_memory(lambda: jsonurl.loads(text, dedup=True))
+    assert result == jsonurl.freeze(_repetitive_query(columns))
+    _check(request.node.name, len(text), peak, retained, LOADS_PEAK_BUDGET)
+    assert retained < frozen
+    if columns > 10:
+        assert retained * 2 < frozen
@@ -0,0 +1,93 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+import jsonurl_py as jsonurl
+
+
+def test_dumps_array():
+    assert jsonurl.dumps(numpy.arange(4)) == "(0,1,2,3)"
+    assert jsonurl.dumps(numpy.arange(6, dtype="u1").reshape(2, 3)) == (
+        "((0,1,2),(3,4,5))"
+    )
+    assert jsonurl.dumps(numpy.array([0.1, 1e20], "f4")) == "(0.1,1e+20)"
+    assert jsonurl.dumps(numpy.array([0.5, -2.0])) == "(0.5,-2.0)"
+    assert jsonurl.dumps(numpy.array([True, False])) == "(true,false)"
+    assert jsonurl.dumps(numpy.array(["a", "b c"])) == "(a,b+c)"
+    assert jsonurl.dumps(numpy.zeros((0, 3))) == "()"
+    assert jsonurl.dumps(numpy.arange(3), implied_list=True) == "0,1,2"
+    assert jsonurl.dumps(dict(a=numpy.arange(2))) == "(a:(0,1))"
+
+
+def test_dumps_scalar():
+    assert jsonurl.dumps(numpy.int64(5)) == "5"
+    assert jsonurl.dumps(numpy.float32(0.1)) == "0.1"
+    assert jsonurl.dumps(numpy.bool_(True)) == "true"
+    assert jsonurl.dumps(numpy.array(3.5)) == "3.5"
+    assert jsonurl.dumps([numpy.int8(1), numpy.float64(2.5)]) == "(1,2.5)"
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        numpy.arange(5),
+        numpy.array([[0.1, 2], [3, 1e20]], "f4"),
+        [numpy.array(3.5, "f4"), numpy.int64(1)],
+    ],
+)
+def test_dumps_array_other_paths(data):
+    text = jsonurl.dumps(data)
+    assert jsonurl.encoded_length(data) == len(text)
+    assert jsonurl.dumps(data, max_length=len(text)) == text
+    assert "".join(jsonurl.iterdumps(data)) == text
+
+
+def test_loads_array():
+    ret = jsonurl.loads(
+        "(a:(1,2,3),b:(1.5,2),c:((1,2),(3,4)),d:(1,x))", numpy_dtype="i4"
+    )
+    assert ret["a"].dtype == numpy.int32
+    assert ret["a"].tolist() == [1, 2, 3]
+    assert ret["b"] == [1.5, 2]
+    assert [x.tolist() for x in ret["c"]] == [[1, 2], [3, 4]]
+    assert ret["d"] == [1, "x"]
+    ret = jsonurl.loads("(1.5,-2e+3,4)", numpy_dtype=numpy.float32)
+    assert ret.dtype == numpy.float32
+    assert ret.tolist() == [1.5, -2000, 4]
+    ret = jsonurl.loads("1,2,3", implied_list=True, numpy_dtype="u1")
+    assert ret.tolist() == [1, 2, 3]
+    assert jsonurl.loads("(a:1)", numpy_dtype=float) == {"a": 1}
+    assert jsonurl.loads("()", numpy_dtype=float) == {}
+
+
+def test_loads_array_roundtrip():
+    data = numpy.arange(-50, 50, dtype="i2").reshape(10, 10)
+    ret = jsonurl.loads(jsonurl.dumps(data), numpy_dtype="i2")
+    assert numpy.array_equal(numpy.array(ret), data)
+    data = numpy.linspace(0, 1, 100)
+    assert numpy.array_equal(
+        jsonurl.loads(jsonurl.dumps(data), numpy_dtype=float, aqf=True), data
+    )
+
+
+def test_loads_array_limits():
+    ret = jsonurl.loads("(18446744073709551615,0)", numpy_dtype="u8")
+    assert ret.tolist() == [2**64 - 1, 0]
+    for text in ["(300)", "(-1)", "(99999999999999999999)"]:
+        with pytest.raises(jsonurl.ParseError, match="out of range"):
+            jsonurl.loads(text, numpy_dtype="u1")
+    with pytest.raises(jsonurl.ParseError, match="max_items"):
+        jsonurl.loads("(1,2,3)", numpy_dtype=float, max_items=2)
+    with pytest.raises(jsonurl.ParseError, match="pos 3 exceeds max_string_length"):
+        jsonurl.loads("(1,223)", numpy_dtype=float, max_string_length=2)
+    with pytest.raises(ValueError, match="numeric"):
+        jsonurl.loads("(1)", numpy_dtype=bool)
+
+
+def test_loads_array_frozen():
+    """Frozen results must be hashable, arrays are not"""
+    with pytest.raises(ValueError, match="numpy_dtype"):
+        jsonurl.loads("(a:(1,2))", numpy_dtype=float, frozen=True)
+    with pytest.raises(ValueError, match="numpy_dtype"):
+        jsonurl.loads("(a:(1,2))", numpy_dtype=float, dedup=True)
+    with pytest.raises(ValueError, match="numpy_dtype"):
+        jsonurl.LoadsCache(copy=True).loads("(1,2)", numpy_dtype=float)
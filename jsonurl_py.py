@@ -6,24 +6,52 @@ Python implementation of jsonurl, an alternative format for JSON data model
 See https://jsonurl.org/ and https://github.com/jsonurl/specification/
 """
 
+from __future__ import annotations
+
 __version__ = "0.4.0"
 
 import re
 import sys
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple, overload
-from urllib.parse import quote_plus
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass, field, fields, replace
+from time import perf_counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Match,
+    Optional,
+    Tuple,
+    TypeVar,
+    overload,
+)
+
+if sys.version_info >= (3, 8):
+    from typing import Final
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+COMPILED = __file__.endswith((".so", ".pyd"))
+"""True when running as a mypyc-compiled extension module, see ``setup_mypyc.py``"""
 
-if sys.hexversion >= 0x030A0000:  # pragma: no cover
+_T = TypeVar("_T")
 
-    def _dataclass_kwonly(*a, **kw):
-        return dataclass(*a, **kw, kw_only=True)  # type: ignore
+# Passed as keywords instead of wrapping dataclass so mypy and mypyc see it
+_KW_ONLY: Dict[str, Any] = {"kw_only": True} if sys.version_info >= (3, 10) else {}
 
+if COMPILED:  # pragma: no cover
+    # mypyc reads the decorator when building and still calls it on import
+    from mypy_extensions import mypyc_attr
 else:
-    _dataclass_kwonly = dataclass
 
+    def mypyc_attr(*attrs: str, **kwattrs: object) -> Callable[[_T], _T]:
+        return lambda cls: cls
 
-@_dataclass_kwonly
+
+@dataclass(**_KW_ONLY)
 class CommonOpts:
     """
     Common options for both `dumps` and `loads`
@@ -57,8 +85,19 @@ class CommonOpts:
     <https://github.com/jsonurl/specification/#296-address-bar-query-string-friendly>`_
     """
 
+    iri: bool = False
+    """Internationalized Resource Identifier mode
+
+    Leave non-ASCII characters allowed in IRIs by :rfc:`3987` unencoded instead
+    of percent-encoding their UTF-8 bytes, which is much shorter for non-Latin
+    text. When loading they are accepted both literal and percent-encoded.
+    """
+
+    slow_hook: Optional["SlowHook"] = None
+    """Hook for slow calls, overrides the global one from `set_slow_hook`"""
 
-@_dataclass_kwonly
+
+@dataclass(**_KW_ONLY)
 class DumpOpts(CommonOpts):
     """
     Options for `jsonurl_py.dumps`
@@ -78,14 +117,426 @@ class DumpOpts(CommonOpts):
     output is readable but on input they are also recognized in encoded form.
     """
 
+    sort_keys: bool = False
+    """
+    Sort dict items by their encoded keys
+
+    With the default ``safe`` this is the canonical form, see `canonicalize`.
+    Sets are only encoded with this option, as lists sorted by their encoded
+    items, because their own order is not stable.
+    """
+
+    max_length: Optional[int] = None
+    """
+    Maximum length of the output, encoding stops with `MaxLengthError` as soon
+    as it is exceeded. See also `encoded_length`.
+    """
+
+    minimize: bool = False
+    """
+    Pick the shortest encoding for each string
+
+    Apostrophes are left unencoded where allowed. Strings with several of the
+    characters ``(),:`` are quoted in non-AQF mode because inside quotes these
+    do not need percent-encoding.
+    """
+
+
+def _opts_dict(opts: CommonOpts) -> Dict[str, Any]:
+    """Options as a dict, unlike `vars` this works for mypyc-compiled classes"""
+    return {f.name: getattr(opts, f.name) for f in fields(opts)}
+
+
+_opts_getters: Dict[type, Callable[[Any], Tuple[Any, ...]]] = {}
+
+
+def _opts_values(opts: CommonOpts) -> Tuple[Any, ...]:
+    """Values of options for `LoadsCache` keys, with a cached getter per class"""
+    getter = _opts_getters.get(type(opts))
+    if getter is None:
+        from operator import attrgetter
+
+        # slow_hook is not hashable and does not change the result, cached
+        # results are always frozen so frozen does not change it either
+        skip = ("slow_hook", "frozen")
+        names = [f.name for f in fields(opts) if f.name not in skip]
+        getter = _opts_getters[type(opts)] = attrgetter(*names)
+    return getter(opts)
+
+
+class MaxLengthError(ValueError):
+    """Output of `dumps` would exceed `DumpOpts.max_length`"""
+
+
+@dataclass
+class Stats:
+    """
+    Counters collected by `loads` and `dumps` when passed as ``stats``
+
+    Counters accumulate so the same object can aggregate many calls. Everything
+    except timing is counted by scanning the jsonurl text after the call so
+    there is no overhead when no collector is passed.
+    """
+
+    calls: int = 0
+    """Number of calls"""
+
+    atoms: int = 0
+    """Number of atoms, including dict keys"""
+
+    composites: int = 0
+    """Number of lists and dicts, including implied ones"""
+
+    percent_bytes: int = 0
+    """Number of percent-encoded bytes in the text"""
+
+    aqf_escapes: int = 0
+    """Number of ``!`` escapes in AQF mode"""
+
+    max_depth: int = 0
+    """Maximum nesting depth of composites"""
+
+    input_length: int = 0
+    """Total length of text passed to `loads`"""
+
+    output_length: int = 0
+    """Total length of text returned by `dumps`"""
+
+    phase_times: Dict[str, float] = field(default_factory=dict)
+    """
+    Seconds spent per phase: ``aqf_decode`` and ``parse`` for `loads` and
+    ``encode`` for `dumps`
+    """
+
+    def _add_time(self, phase: str, elapsed: float):
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + elapsed
+
+
+def _scan_stats(arg: str, opts: CommonOpts, stats: Stats):
+    """Count structure in jsonurl text without decoding it
+
+    In AQF mode the text must be partially decoded already. Invalid text is
+    counted on a best-effort basis.
+    """
+    depth = 1 if opts.implied_list or opts.implied_dict else 0
+    stats.composites += depth
+    max_depth = depth
+    atoms = 0
+    escapes = 0
+    # start of the current atom, if any
+    atom_pos = 0
+    pos = 0
+    regex = re.compile(r"[(),:!]" if opts.aqf else r"[(),:']")
+    while True:
+        match = regex.search(arg, pos)
+        if match is None:
+            if atom_pos < len(arg):
+                atoms += 1
+            break
+        char = match.group()
+        pos = match.end()
+        if char == "!":
+            escapes += 1
+            pos += 1
+            continue
+        if char == "'":
+            if match.start() == atom_pos:
+                # quoted string, skip to the closing quote
+                pos = arg.find("'", pos) + 1 or len(arg)
+            continue
+        if match.start() != atom_pos:
+            atoms += 1
+        atom_pos = pos
+        if char == "(":
+            depth += 1
+            stats.composites += 1
+            if depth > max_depth:
+                max_depth = depth
+        elif char == ")":
+            depth -= 1
+    stats.atoms += atoms
+    stats.aqf_escapes += escapes
+    if max_depth > stats.max_depth:
+        stats.max_depth = max_depth
+
+
+@dataclass
+class SlowCall:
+    """
+    Details of a slow `loads` or `dumps` call passed to `SlowHook.callback`
+    """
+
+    func: str
+    """Either ``"loads"`` or ``"dumps"``"""
+
+    text: str
+    """The jsonurl text: input of `loads` or output of `dumps`, maybe truncated"""
+
+    truncated: bool
+    """If `text` was truncated to `SlowHook.max_text_length`"""
+
+    opts: CommonOpts
+    """Options of the call"""
+
+    duration: float
+    """Duration of the call in seconds"""
+
+    stats: Stats
+    """Counters for this call only, without phase times"""
+
+    error: Optional[Exception] = None
+    """Exception raised by the call, if any"""
+
+    def replay_record(self) -> Dict[str, Any]:
+        """
+        JSON-serializable record of the call
+
+        Records saved one per line can be replayed via the
+        ``JSONURL_BENCHMARK_REPLAY`` environment variable of the benchmarks.
+        """
+        return dict(
+            func=self.func,
+            text=self.text,
+            truncated=self.truncated,
+            opts={k: v for k, v in _opts_dict(self.opts).items() if k != "slow_hook"},
+            duration=self.duration,
+        )
+
+
+@dataclass(**_KW_ONLY)
+class SlowHook:
+    """
+    Callback for `loads` and `dumps` calls exceeding a time or size threshold
+
+    The callback fires if any threshold is reached, or for every call if no
+    threshold is set. Registered either globally with `set_slow_hook` or per
+    call via `CommonOpts.slow_hook`.
+    """
+
+    callback: Callable[[SlowCall], None]
+    """Function called with the details of the slow call"""
+
+    min_duration: Optional[float] = None
+    """Minimum call duration in seconds"""
+
+    min_length: Optional[int] = None
+    """Minimum length of the jsonurl text"""
+
+    max_text_length: int = 4096
+    """Text passed to the callback is truncated to this length"""
+
+
+_slow_hook: Optional[SlowHook] = None
+
+
+def set_slow_hook(hook: Optional[SlowHook]) -> Optional[SlowHook]:
+    """Set the global `SlowHook` and return the previous one"""
+    global _slow_hook
+    ret = _slow_hook
+    _slow_hook = hook
+    return ret
+
+
+def _fire_slow_hook(
+    hook: SlowHook,
+    func: str,
+    text: str,
+    opts: CommonOpts,
+    duration: float,
+    error: Optional[Exception],
+):
+    if hook.min_duration is not None or hook.min_length is not None:
+        if not (
+            (hook.min_duration is not None and duration >= hook.min_duration)
+            or (hook.min_length is not None and len(text) >= hook.min_length)
+        ):
+            return
+    stats = Stats(calls=1)
+    if func == "loads":
+        stats.input_length = len(text)
+    else:
+        stats.output_length = len(text)
+    stats.percent_bytes = text.count("%")
+    try:
+        _scan_stats(_partial_decode_aqf(text) if opts.aqf else text, opts, stats)
+    except ParseError:
+        pass
+    truncated = len(text) > hook.max_text_length
+    if truncated:
+        text = text[: hook.max_text_length]
+    hook.callback(SlowCall(func, text, truncated, opts, duration, stats, error))
+
+
+# Startup-sensitive dependencies are compiled or imported on first use. The
+# placeholders below replace themselves so there is no overhead afterwards.
+
+
+def _lazy_regex(name: str, pattern: str, method: str = "match") -> Callable:
+    """Placeholder for the method of a compiled regex stored as global name"""
+
+    def placeholder(*args):
+        func = getattr(re.compile(pattern), method)
+        globals()[name] = func
+        return func(*args)
+
+    return placeholder
+
+
+def _lazy_quote_plus(arg: str, safe: str = "") -> str:
+    global _quote_plus
+    from urllib.parse import quote_plus
+
+    _quote_plus = quote_plus
+    return quote_plus(arg, safe)
+
+
+_RE_NUMBER = r"^-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?$"
+_RE_INT_NUMBER = r"^-?\d+$"
+
+_match_number = _lazy_regex("_match_number", _RE_NUMBER)
+_match_int_number = _lazy_regex("_match_int_number", _RE_INT_NUMBER)
+# Strings which are dumped as is and never need quotes: not empty, not
+# starting with a digit or minus sign and not true, false or null
+_RE_PLAIN_STR_ITEM = r"(?!(?:true|false|null)(?:,|$))[A-Za-z_.~][A-Za-z0-9_.~-]*"
+_fullmatch_plain_str_list = _lazy_regex(
+    "_fullmatch_plain_str_list",
+    _RE_PLAIN_STR_ITEM + "(?:," + _RE_PLAIN_STR_ITEM + ")*",
+    "fullmatch",
+)
+_quote_plus: Callable[..., str] = _lazy_quote_plus
+
+# Non-ASCII characters allowed unencoded in IRIs: ucschar from RFC 3987
+_IRI_CHAR_RANGES = (
+    "\u00a0-\ud7ff\uf900-\ufdcf\ufdf0-\uffef"
+    + "".join(
+        f"{chr(plane << 16)}-{chr((plane << 16) + 0xFFFD)}" for plane in range(1, 14)
+    )
+    + "\U000e1000-\U000efffd"
+)
+_match_iri_char = _lazy_regex("_match_iri_char", f"[{_IRI_CHAR_RANGES}]")
+
+
+class _IriQuoter(dict):
+    """Encoded form of single characters by character, for one safe string"""
+
+    maxsize: Final = 4096
+    """Stop adding characters, any script only has a few thousand in use"""
+
+    def __init__(self, safe: str):
+        self.safe = safe
+
+    def __missing__(self, char: str) -> str:
+        if char >= "\xa0" and _match_iri_char(char):
+            ret = char
+        else:
+            ret = _quote_plus(char, self.safe)
+        if len(self) < self.maxsize:
+            self[char] = ret
+        return ret
+
+
+_iri_quoters: Dict[str, _IriQuoter] = {}
+
+
+def _quote_iri(arg: str, safe: str = "") -> str:
+    """Like quote_plus but leave characters allowed in IRIs unencoded"""
+    if arg.isascii():
+        return _quote_plus(arg, safe)
+    quoter = _iri_quoters.get(safe)
+    if quoter is None:
+        quoter = _iri_quoters[safe] = _IriQuoter(safe)
+    return "".join(map(quoter.__getitem__, arg))
+
+
+# Homogeneous sequences of numbers or strings are encoded in bulk, this skips
+# the type checks in _dump_any for each item
+_NUMBER_TYPES = ({int}, {float}, {int, float})
+_NUMBER_ARRAY_TYPECODES = frozenset("bBhHiIlLqQfd")
+
+
+def _dump_str_list(arg: Any, opts: DumpOpts) -> str:
+    text = ",".join(arg)
+    # Plain items joined together have exactly one comma between each
+    if text.count(",") == len(arg) - 1 and _fullmatch_plain_str_list(text):
+        return text
+    return ",".join([_dump_str(x, opts) for x in arg])
+
 
 def _dump_list_data(arg: Any, opts: DumpOpts) -> str:
-    return ",".join(_dump_any(x, opts) for x in arg)
+    if isinstance(arg, (list, tuple)):
+        if len(arg) >= 8:
+            types = set(map(type, arg))
+            if types in _NUMBER_TYPES:
+                return ",".join(map(str, arg))
+            if types == {str}:
+                return _dump_str_list(arg, opts)
+    elif isinstance(arg, range):
+        return ",".join(map(str, arg))
+    elif isinstance(arg, (set, frozenset)):
+        arg = _set_items(arg, opts)
+    elif _is_numpy_array(arg) and arg.ndim:
+        return _dump_numpy_data(arg, opts)
+    else:
+        from array import array
+
+        if isinstance(arg, array) and arg.typecode in _NUMBER_ARRAY_TYPECODES:
+            return ",".join(map(str, arg))
+    return ",".join([_dump_any(x, opts) for x in arg])
+
+
+# NumPy is optional and never imported here, if it was not imported by the
+# caller then there are no arrays to encode
+
+
+def _is_numpy_array(arg: Any) -> bool:
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(arg, (numpy.ndarray, numpy.generic))
+
+
+def _dump_numpy_data(arg: Any, opts: DumpOpts) -> str:
+    """Items of a numpy array with at least one dimension"""
+    if arg.dtype.kind not in "iuf":
+        return _dump_list_data(arg.tolist(), opts)
+    if arg.ndim == 1:
+        if arg.dtype.kind == "f" and arg.dtype.itemsize < 8:
+            # Shortest repr in the precision of the array, not as a double
+            return ",".join(arg.astype(str).tolist())
+        return ",".join(map(str, arg.tolist()))
+    return ",".join(["(" + _dump_numpy_data(row, opts) + ")" for row in arg])
+
+
+def _first_item(arg: Tuple[str, Any]) -> str:
+    return arg[0]
+
+
+def _dump_key(arg: Any, opts: DumpOpts) -> str:
+    """Encode a dict key, like in JSON only atoms are accepted"""
+    if isinstance(arg, str):
+        return _dump_str(arg, opts)
+    if arg is None or isinstance(arg, (int, float)):
+        return _dump_any(arg, opts)
+    if _is_numpy_array(arg) and arg.ndim == 0:
+        return _dump_any(arg, opts)
+    raise TypeError(f"Bad key {arg!r} of type {type(arg)}, keys must be atoms")
+
+
+def _set_items(arg: Any, opts: DumpOpts) -> List[Any]:
+    """Items of a set sorted by their encoding, see `DumpOpts.sort_keys`"""
+    if not opts.sort_keys:
+        raise TypeError(f"Bad value {arg!r} of type {type(arg)}, sets need sort_keys")
+    return sorted(arg, key=lambda item: _dump_any(item, opts))
 
 
 def _dump_dict_data(arg: Any, opts: DumpOpts) -> str:
+    if opts.sort_keys:
+        items = sorted(
+            ((_dump_key(k, opts), v) for k, v in arg.items()), key=_first_item
+        )
+        return ",".join([k + ":" + _dump_any(v, opts) for k, v in items])
+    # Lists rather than generators: join builds a list anyway, and generators
+    # are much slower than list comprehensions on PyPy
     return ",".join(
-        _dump_any(k, opts) + ":" + _dump_any(v, opts) for k, v in arg.items()
+        [_dump_key(k, opts) + ":" + _dump_any(v, opts) for k, v in arg.items()]
     )
 
 
@@ -99,9 +550,12 @@ def _dump_str(arg: str, opts: DumpOpts) -> str:
             return "!null"
         if arg == "":
             return "!e"
-        if RE_NUMBER.match(arg):
+        if _match_number(arg):
             return "!" + arg
-        return quote_plus(arg, safe=opts.safe + "(),:!").translate(
+        quote = _quote_iri if opts.iri else _quote_plus
+        # apostrophes have no meaning in AQF mode
+        safe = opts.safe + "(),:!'" if opts.minimize else opts.safe + "(),:!"
+        return quote(arg, safe=safe).translate(
             {
                 ord("!"): "!!",
                 ord("("): "!(",
@@ -119,9 +573,28 @@ def _dump_str(arg: str, opts: DumpOpts) -> str:
             return "'null'"
         if arg == "":
             return "''"
-        if RE_NUMBER.match(arg):
+        if _match_number(arg):
             return "'" + arg + "'"
-        return quote_plus(arg, safe=opts.safe)
+        if opts.minimize:
+            return _dump_str_minimize(arg, opts)
+        if opts.iri:
+            return _quote_iri(arg, safe=opts.safe)
+        return _quote_plus(arg, safe=opts.safe)
+
+
+def _dump_str_minimize(arg: str, opts: DumpOpts) -> str:
+    """Shortest non-AQF encoding of a string which needs no quotes"""
+    quote = _quote_iri if opts.iri else _quote_plus
+    # apostrophes only need encoding at the start of an unquoted string
+    ret = quote(arg, safe=opts.safe + "'")
+    if ret[0] == "'":
+        ret = "%27" + ret[1:]
+    # each of (),: is 3 characters shorter quoted, which costs 2
+    if sum(map(arg.count, "(),:")) > 1:
+        quoted = "'" + quote(arg, safe=opts.safe + "(),:") + "'"
+        if len(quoted) < len(ret):
+            return quoted
+    return ret
 
 
 def _dump_any(arg: Any, opts: DumpOpts) -> str:
@@ -137,37 +610,189 @@ def _dump_any(arg: Any, opts: DumpOpts) -> str:
         return str(arg)
     if isinstance(arg, float):
         return str(arg)
-    if isinstance(arg, list):
+    if isinstance(arg, (list, tuple)):
         return "(" + _dump_list_data(arg, opts) + ")"
-    if isinstance(arg, dict):
+    if isinstance(arg, (dict, Mapping)):
         if len(arg) == 0 and opts.distinguish_empty_list_dict:
             return "(:)"
         else:
             return "(" + _dump_dict_data(arg, opts) + ")"
+    if _is_numpy_array(arg):
+        if arg.ndim == 0:
+            if arg.dtype.kind == "f":
+                return str(arg)
+            return _dump_any(arg.item(), opts)
+        return "(" + _dump_numpy_data(arg, opts) + ")"
+    if _is_list_like(arg):
+        return "(" + _dump_list_data(arg, opts) + ")"
     raise TypeError(f"Bad value {arg!r} of type {type(arg)}")
 
 
+def _is_list_like(arg: Any) -> bool:
+    """If arg is dumped as a list: iterables except strings and mappings"""
+    if isinstance(arg, (str, bytes, bytearray, Mapping)):
+        return False
+    if _is_numpy_array(arg):
+        return arg.ndim != 0
+    return isinstance(arg, Iterable)
+
+
+def _raise_max_length(opts: DumpOpts):
+    raise MaxLengthError(f"Output exceeds max_length {opts.max_length}")
+
+
+def _dump_limited_list_data(
+    arg: Any, opts: DumpOpts, out: List[str], budget: int
+) -> int:
+    if isinstance(arg, (set, frozenset)):
+        arg = _set_items(arg, opts)
+    for index, item in enumerate(arg):
+        if index:
+            out.append(",")
+            budget -= 1
+        budget = _dump_limited(item, opts, out, budget)
+    return budget
+
+
+def _dump_limited_dict_data(
+    arg: Any, opts: DumpOpts, out: List[str], budget: int
+) -> int:
+    items: Iterable[Tuple[str, Any]] = ((_dump_key(k, opts), v) for k, v in arg.items())
+    if opts.sort_keys:
+        items = sorted(items, key=_first_item)
+    for index, (key, val) in enumerate(items):
+        if index:
+            out.append(",")
+            budget -= 1
+        out.append(key)
+        out.append(":")
+        budget -= len(key) + 1
+        if budget < 0:
+            _raise_max_length(opts)
+        budget = _dump_limited(val, opts, out, budget)
+    return budget
+
+
+def _dump_limited(arg: Any, opts: DumpOpts, out: List[str], budget: int) -> int:
+    """Append the encoding of arg to out and return the remaining budget
+
+    Raises `MaxLengthError` once the budget is exhausted, parens are accounted
+    for before the items so this happens as early as possible.
+    """
+    if arg is None or isinstance(arg, (str, int, float)):
+        text = _dump_any(arg, opts)
+        out.append(text)
+        budget -= len(text)
+    elif isinstance(arg, (list, tuple)) or _is_list_like(arg):
+        out.append("(")
+        budget = _dump_limited_list_data(arg, opts, out, budget - 2)
+        out.append(")")
+    elif isinstance(arg, (dict, Mapping)):
+        if len(arg) == 0 and opts.distinguish_empty_list_dict:
+            out.append("(:)")
+            budget -= 3
+        else:
+            out.append("(")
+            budget = _dump_limited_dict_data(arg, opts, out, budget - 2)
+            out.append(")")
+    else:
+        text = _dump_any(arg, opts)
+        out.append(text)
+        budget -= len(text)
+    if budget < 0:
+        _raise_max_length(opts)
+    return budget
+
+
+def _dump_limited_top(arg: Any, opts: DumpOpts, max_length: int) -> str:
+    out: List[str] = []
+    if opts.implied_dict:
+        budget = _dump_limited_dict_data(arg, opts, out, max_length)
+    elif opts.implied_list:
+        budget = _dump_limited_list_data(arg, opts, out, max_length)
+    else:
+        budget = _dump_limited(arg, opts, out, max_length)
+    if budget < 0:
+        _raise_max_length(opts)
+    return "".join(out)
+
+
+def _dump_top(arg: Any, opts: DumpOpts) -> str:
+    if opts.max_length is not None:
+        return _dump_limited_top(arg, opts, opts.max_length)
+    if opts.implied_dict:
+        return _dump_dict_data(arg, opts)
+    if opts.implied_list:
+        return _dump_list_data(arg, opts)
+    return _dump_any(arg, opts)
+
+
+def _dump_stats(arg: Any, opts: DumpOpts, stats: Stats) -> str:
+    start = perf_counter()
+    ret = _dump_top(arg, opts)
+    stats._add_time("encode", perf_counter() - start)
+    stats.calls += 1
+    stats.output_length += len(ret)
+    stats.percent_bytes += ret.count("%")
+    _scan_stats(ret, opts, stats)
+    return ret
+
+
+def _dump_hooked(
+    arg: Any, opts: DumpOpts, stats: Optional[Stats], hook: SlowHook
+) -> str:
+    ret = ""
+    error = None
+    start = perf_counter()
+    try:
+        if stats is not None:
+            ret = _dump_stats(arg, opts, stats)
+        else:
+            ret = _dump_top(arg, opts)
+        return ret
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _fire_slow_hook(hook, "dumps", ret, opts, perf_counter() - start, error)
+
+
 @overload
-def dumps(arg: Any, opts: Optional[DumpOpts] = None) -> str: ...
+def dumps(
+    arg: Any, opts: Optional[DumpOpts] = None, *, stats: Optional[Stats] = None
+) -> str: ...
 
 
 @overload
 def dumps(
     arg: Any,
     *,
+    stats: Optional[Stats] = None,
     implied_list: bool = False,
     implied_dict: bool = False,
     aqf: bool = False,
+    iri: bool = False,
     safe: str = "",
+    minimize: bool = False,
     distinguish_empty_list_dict: bool = False,
+    slow_hook: Optional[SlowHook] = None,
+    sort_keys: bool = False,
+    max_length: Optional[int] = None,
 ) -> str: ...
 
 
-def dumps(arg: Any, opts=None, **kw) -> str:
+def dumps(arg: Any, opts=None, *, stats=None, **kw) -> str:
     """
     Convert a json object into a jsonurl string
 
+    Any `collections.abc.Mapping` is encoded as a dict and any other iterable
+    except strings and bytes as a list, for example tuples, ranges and
+    generators. Sets need `DumpOpts.sort_keys` to be encoded. Dict keys must be
+    strings, numbers, bools or None like in JSON.
+
     Options can be passed as a `DumpOpts` object or as individual keyword arguments.
+
+    If a `Stats` object is passed then counters are added to it.
     """
     if opts is None:
         opts = DumpOpts(**kw)
@@ -175,117 +800,611 @@ def dumps(arg: Any, opts=None, **kw) -> str:
         raise ValueError("Either opts or kw, not both")
     check_can_mark_safe(opts.safe, opts.aqf)
 
-    if opts.implied_dict:
-        return _dump_dict_data(arg, opts)
-    if opts.implied_list:
-        return _dump_list_data(arg, opts)
-    return _dump_any(arg, opts)
+    hook = opts.slow_hook or _slow_hook
+    if hook is not None:
+        return _dump_hooked(arg, opts, stats, hook)
+    if stats is not None:
+        return _dump_stats(arg, opts, stats)
+    return _dump_top(arg, opts)
 
 
-def check_can_mark_safe(safe: str, aqf=False):
-    """Check if a string can be marked as safe for jsonurl"""
-    for c in safe:
-        if c in "!$*/;?@":
-            continue
-        if aqf and c == "'":
-            continue
-        raise ValueError(f"Can't mark character {c!r} as safe")
+# Streaming output encodes items one by one, iterables which are not lists
+# or tuples are streamed recursively
 
 
-@_dataclass_kwonly
-class LoadOpts(CommonOpts):
-    """
-    Options for `loads` method
-    """
+def _iterdump_value(arg: Any, opts: DumpOpts, prefix: str) -> Iterator[str]:
+    if _is_list_like(arg) and not isinstance(arg, (list, tuple)):
+        yield prefix + "("
+        yield from _iterdump_list_data(arg, opts)
+        yield ")"
+    else:
+        yield prefix + _dump_any(arg, opts)
 
 
-RE_NUMBER = re.compile(r"^-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?$")
-RE_INT_NUMBER = re.compile(r"^-?\d+$")
+def _iterdump_list_data(arg: Any, opts: DumpOpts) -> Iterator[str]:
+    if isinstance(arg, (set, frozenset)):
+        arg = _set_items(arg, opts)
+    prefix = ""
+    for item in arg:
+        yield from _iterdump_value(item, opts, prefix)
+        prefix = ","
 
 
-class ParseError(Exception):
-    pass
+def _iterdump_dict_data(arg: Any, opts: DumpOpts) -> Iterator[str]:
+    items: Iterable[Tuple[str, Any]] = ((_dump_key(k, opts), v) for k, v in arg.items())
+    if opts.sort_keys:
+        items = sorted(items, key=_first_item)
+    prefix = ""
+    for key, val in items:
+        yield from _iterdump_value(val, opts, prefix + key + ":")
+        prefix = ","
 
 
-def _load_hexdigit(arg: str, pos: int) -> int:
-    char = arg[pos]
-    if char >= "0" and char <= "9":
-        return ord(char) - ord("0")
-    elif char >= "a" and char <= "f":
-        return ord(char) - ord("a") + 10
-    elif char >= "A" and char <= "F":
-        return ord(char) - ord("A") + 10
+def _iterdump_top(arg: Any, opts: DumpOpts) -> Iterator[str]:
+    if opts.implied_dict:
+        yield from _iterdump_dict_data(arg, opts)
+    elif opts.implied_list:
+        yield from _iterdump_list_data(arg, opts)
+    elif isinstance(arg, (list, tuple)) or _is_list_like(arg):
+        yield "("
+        yield from _iterdump_list_data(arg, opts)
+        yield ")"
+    elif isinstance(arg, Mapping) and (
+        len(arg) or not opts.distinguish_empty_list_dict
+    ):
+        yield "("
+        yield from _iterdump_dict_data(arg, opts)
+        yield ")"
     else:
-        raise ParseError(f"Invalid hex digit {char!r} at pos {pos}")
+        yield _dump_any(arg, opts)
 
 
-def _load_percent(arg: str, pos: int) -> Tuple[str, int]:
-    arr = []
-    while pos < len(arg) and arg[pos] == "%":
-        if pos + 2 >= len(arg):
-            raise ParseError(f"Unterminated percent at pos {pos}")
-        arr.append(_load_hexdigit(arg, pos + 1) * 16 + _load_hexdigit(arg, pos + 2))
-        pos += 3
-    return bytes(arr).decode("utf-8"), pos
+@overload
+def iterdumps(arg: Any, opts: Optional[DumpOpts] = None) -> Iterator[str]: ...
 
 
-_UNENCODED_CHAR_LIST = (
-    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-._~!$*/;?@"
-)
+@overload
+def iterdumps(
+    arg: Any,
+    *,
+    implied_list: bool = False,
+    implied_dict: bool = False,
+    aqf: bool = False,
+    iri: bool = False,
+    safe: str = "",
+    minimize: bool = False,
+    distinguish_empty_list_dict: bool = False,
+    sort_keys: bool = False,
+) -> Iterator[str]: ...
 
 
-def _is_unencoded(char: str) -> bool:
-    """If one of the sharacters listed as "unencoded" in jsonurl spec"""
-    return char in _UNENCODED_CHAR_LIST
+def iterdumps(arg: Any, opts=None, **kw) -> Iterator[str]:
+    """
+    Encode like `dumps` but return the output in pieces
 
+    Items of the top-level list or dict and of nested iterables which are not
+    lists or tuples, for example generators, are encoded one at a time. Memory
+    use then does not grow with their number if the pieces are written out as
+    they come, for example with ``fp.writelines(iterdumps(rows))``.
 
-_AQF_PARTIAL_DECODE_SET = set([ord("("), ord(")"), ord(","), ord(":"), ord("!")])
+    ``max_length``, ``stats`` and slow hooks are not supported.
+    """
+    if opts is None:
+        opts = DumpOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    check_can_mark_safe(opts.safe, opts.aqf)
+    if opts.max_length is not None:
+        raise ValueError("iterdumps does not support max_length")
+    return _iterdump_top(arg, opts)
 
 
-def _partial_decode_aqf(arg: str) -> str:
-    """Perform partial percent decoding for AQF
+class Slot:
+    """
+    Placeholder for a varying value in the shape passed to `compile_template`
+    """
 
-    Affects (),:!
+    # Not a dataclass, those are slow to define at import time
+    __slots__ = ("name",)
+
+    name: str
+    """Keyword argument which provides the value when calling the `Template`"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return f"{type(self).__name__}(name={self.name!r})"
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+def _template_parts(arg: Any, opts: DumpOpts, parts: List[Any]):
+    """Append constant text and slots of arg to parts"""
+    if isinstance(arg, Slot):
+        parts.append(arg)
+    elif isinstance(arg, (list, tuple)):
+        parts.append("(")
+        _template_list_parts(arg, opts, parts)
+        parts.append(")")
+    elif isinstance(arg, Mapping) and (
+        len(arg) or not opts.distinguish_empty_list_dict
+    ):
+        parts.append("(")
+        _template_dict_parts(arg, opts, parts)
+        parts.append(")")
+    else:
+        parts.append(_dump_any(arg, opts))
 
-    All the characters involved are ascii so they can't be part of a multi-byte
-    character. Overlong encodings don't need handling either, they will reach
-    _load_percent and be rejected by the python utf-8 decoder.
 
-    This is done so that the rest of the parser can check for structural
-    characters without worrying about percent enconding.
-    """
-    ret = ""
-    spos = 0
-    while True:
-        epos = arg.find("%", spos)
-        if epos == -1:
-            return ret + arg[spos:]
-        if epos + 2 >= len(arg):
-            raise ParseError(f"Unterminated percent at pos {epos}")
-        val = _load_hexdigit(arg, epos + 1) * 16 + _load_hexdigit(arg, epos + 2)
-        if val in _AQF_PARTIAL_DECODE_SET:
-            ret += arg[spos:epos] + chr(val)
-            spos = epos + 3
-        else:
-            ret += arg[spos : epos + 3]
-            spos = epos + 3
+def _template_list_parts(arg: Any, opts: DumpOpts, parts: List[Any]):
+    for index, item in enumerate(arg):
+        if index:
+            parts.append(",")
+        _template_parts(item, opts, parts)
 
 
-def _unquote_aqf(arg: str) -> str:
-    ret = ""
-    spos = 0
-    while True:
-        epos = arg.find("!", spos)
-        if epos == -1:
-            return ret + arg[spos:]
-        if epos == len(arg) - 1:
-            raise ParseError(f"Invalid trailing ! in atom {arg!r}")
-        eval = arg[epos + 1]
-        if eval in "():,0123456789+-!fnt":
-            ret += arg[spos:epos] + eval
-            spos = epos + 2
-        else:
-            raise ParseError(f"Invalid !-escaped char {hex(ord(eval))}")
+def _template_dict_parts(arg: Any, opts: DumpOpts, parts: List[Any]):
+    items: Iterable[Tuple[str, Any]] = ((_dump_key(k, opts), v) for k, v in arg.items())
+    if opts.sort_keys:
+        items = sorted(items, key=_first_item)
+    for index, (key, val) in enumerate(items):
+        parts.append(("," if index else "") + key + ":")
+        _template_parts(val, opts, parts)
+
+
+class Template:
+    """
+    Compiled `dumps` of a fixed shape, see `compile_template`
+
+    Calling it with the slot values as keyword arguments returns the same text
+    as `dumps` of the shape with each `Slot` replaced by its value.
+    """
+
+    def __init__(self, shape: Any, opts: DumpOpts):
+        parts: List[Any] = []
+        if opts.implied_dict:
+            _template_dict_parts(shape, opts, parts)
+        elif opts.implied_list:
+            _template_list_parts(shape, opts, parts)
+        else:
+            _template_parts(shape, opts, parts)
+        self.opts = opts
+        """Options used for both the shape and the slot values"""
+        # Constant text before each slot, followed by the text after the last
+        self._prefixes: List[str] = []
+        self._names: List[str] = []
+        text = ""
+        for part in parts:
+            if isinstance(part, Slot):
+                self._prefixes.append(text)
+                self._names.append(part.name)
+                text = ""
+            else:
+                text += part
+        self._suffix = text
+        self.slots = tuple(dict.fromkeys(self._names))
+        """Names of the slots in order of first appearance"""
+
+    def __call__(self, **values: Any) -> str:
+        if len(values) != len(self.slots):
+            unknown = set(values) - set(self.slots)
+            if unknown:
+                raise TypeError(f"Unknown slots {sorted(unknown)}")
+        opts = self.opts
+        try:
+            ret = (
+                "".join(
+                    [
+                        prefix + _dump_any(values[name], opts)
+                        for prefix, name in zip(self._prefixes, self._names)
+                    ]
+                )
+                + self._suffix
+            )
+        except KeyError as e:
+            raise TypeError(f"Missing value for slot {e.args[0]!r}") from None
+        if opts.max_length is not None and len(ret) > opts.max_length:
+            _raise_max_length(opts)
+        return ret
+
+
+@overload
+def compile_template(shape: Any, opts: Optional[DumpOpts] = None) -> Template: ...
+
+
+@overload
+def compile_template(
+    shape: Any,
+    *,
+    implied_list: bool = False,
+    implied_dict: bool = False,
+    aqf: bool = False,
+    iri: bool = False,
+    safe: str = "",
+    minimize: bool = False,
+    distinguish_empty_list_dict: bool = False,
+    sort_keys: bool = False,
+    max_length: Optional[int] = None,
+) -> Template: ...
+
+
+def compile_template(shape: Any, opts=None, **kw) -> Template:
+    """
+    Pre-encode the constant parts of a shape for fast repeated `dumps`
+
+    The shape is data as passed to `dumps` where varying values are marked with
+    `Slot` objects, for example::
+
+        link = compile_template(
+            {"filter": {"status": Slot("status")}, "page": Slot("page")},
+            implied_dict=True,
+        )
+        link(status="open", page=2)  # "filter:(status:open),page:2"
+
+    Only lists, tuples and mappings are searched for slots, other values are
+    encoded once. Stats and slow hooks are not supported.
+    """
+    if opts is None:
+        opts = DumpOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    check_can_mark_safe(opts.safe, opts.aqf)
+    return Template(shape, opts)
+
+
+_fullmatch_plain_str = _lazy_regex(
+    "_fullmatch_plain_str", r"[A-Za-z0-9_.~-]+", "fullmatch"
+)
+
+
+_KEYWORDS = ("true", "false", "null")
+
+
+def _encoded_length_str(arg: str, opts: DumpOpts) -> int:
+    if _fullmatch_plain_str(arg) and arg not in _KEYWORDS and not _match_number(arg):
+        return len(arg)
+    return len(_dump_str(arg, opts))
+
+
+def _encoded_length_list_data(arg: Any, opts: DumpOpts) -> int:
+    if isinstance(arg, (set, frozenset)):
+        # checks sort_keys like dumps, the order does not change the length
+        _set_items(arg, opts)
+    # one comma between each item
+    ret = -1
+    for item in arg:
+        ret += _encoded_length_any(item, opts) + 1
+    return max(ret, 0)
+
+
+def _encoded_length_dict_data(arg: Any, opts: DumpOpts) -> int:
+    # one colon per item and one comma between each item
+    ret = -1
+    for key, val in arg.items():
+        if isinstance(key, str):
+            ret += _encoded_length_str(key, opts)
+        else:
+            ret += len(_dump_key(key, opts))
+        ret += _encoded_length_any(val, opts) + 2
+    return max(ret, 0)
+
+
+def _encoded_length_any(arg: Any, opts: DumpOpts) -> int:
+    if isinstance(arg, str):
+        return _encoded_length_str(arg, opts)
+    if arg is None or isinstance(arg, (int, float)):
+        return len(_dump_any(arg, opts))
+    if isinstance(arg, (list, tuple)) or _is_list_like(arg):
+        return _encoded_length_list_data(arg, opts) + 2
+    if isinstance(arg, (dict, Mapping)):
+        if len(arg) == 0 and opts.distinguish_empty_list_dict:
+            return 3
+        return _encoded_length_dict_data(arg, opts) + 2
+    return len(_dump_any(arg, opts))
+
+
+@overload
+def encoded_length(arg: Any, opts: Optional[DumpOpts] = None) -> int: ...
+
+
+@overload
+def encoded_length(
+    arg: Any,
+    *,
+    implied_list: bool = False,
+    implied_dict: bool = False,
+    aqf: bool = False,
+    iri: bool = False,
+    safe: str = "",
+    minimize: bool = False,
+    distinguish_empty_list_dict: bool = False,
+) -> int: ...
+
+
+def encoded_length(arg: Any, opts=None, **kw) -> int:
+    """
+    Length of the output of `dumps` without building it
+
+    Only atoms which need escaping are actually encoded. Iterators such as
+    generators are consumed.
+    """
+    if opts is None:
+        opts = DumpOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    check_can_mark_safe(opts.safe, opts.aqf)
+    if opts.implied_dict:
+        return _encoded_length_dict_data(arg, opts)
+    if opts.implied_list:
+        return _encoded_length_list_data(arg, opts)
+    return _encoded_length_any(arg, opts)
+
+
+def check_can_mark_safe(safe: str, aqf=False):
+    """Check if a string can be marked as safe for jsonurl"""
+    for c in safe:
+        if c in "!$*/;?@":
+            continue
+        if aqf and c == "'":
+            continue
+        raise ValueError(f"Can't mark character {c!r} as safe")
+
+
+@dataclass(**_KW_ONLY)
+class LoadOpts(CommonOpts):
+    """
+    Options for `loads` method
+
+    The ``max_*`` limits are checked while parsing so that bad input is rejected
+    before doing all the work, exceeding them raises `ParseError`.
+    """
+
+    max_input_length: Optional[int] = None
+    """Maximum length of the input text"""
+
+    max_depth: Optional[int] = None
+    """Maximum nesting depth of lists and dicts, implied ones included"""
+
+    max_items: Optional[int] = None
+    """Maximum number of items in any single list or dict"""
+
+    max_string_length: Optional[int] = None
+    """
+    Maximum length of any atom after percent-decoding, including numbers and
+    dict keys. In AQF mode ``!`` escapes count towards the length.
+    """
+
+    frozen: bool = False
+    """
+    Return tuples instead of lists and `FrozenDict` instead of dicts
+
+    Same result as `freeze` but without a second pass over the data.
+    """
+
+    dedup: bool = False
+    """
+    Return one shared object for composites with identical text
+
+    Repeated sub-objects then take memory only once. Results are frozen like
+    with `frozen` so that sharing is safe.
+    """
+
+    numpy_dtype: Any = None
+    """
+    Return lists of only numbers as ``numpy.ndarray`` of this dtype
+
+    Must be an integer or floating point dtype, for integers the list must not
+    contain fractions or exponents. Such lists are parsed in bulk, other lists
+    including nested ones are returned as usual. Requires NumPy.
+
+    Arrays are not hashable so this can't be combined with `frozen` or `dedup`,
+    nor used with `LoadsCache`.
+    """
+
+    def __post_init__(self):
+        if self.numpy_dtype is not None and (self.frozen or self.dedup):
+            raise ValueError("numpy_dtype can't be combined with frozen or dedup")
+
+
+def _module_getattr(name: str):
+    # Compiled regexes used to be public, keep them available lazily
+    if name == "RE_NUMBER":
+        return re.compile(_RE_NUMBER)
+    if name == "RE_INT_NUMBER":
+        return re.compile(_RE_INT_NUMBER)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Assigned rather than defined: mypyc looks up attributes on the module
+# before its body runs and a compiled __getattr__ would be called too early
+__getattr__ = _module_getattr
+
+
+class ParseError(Exception):
+    """
+    Invalid jsonurl text
+
+    In AQF mode positions refer to the text after partial decoding of
+    ``%28 %29 %2C %3A %21``.
+    """
+
+    pos: Optional[int]
+    """Position of the error, if known"""
+
+    def __init__(self, msg: str, pos: Optional[int] = None):
+        super().__init__(msg)
+        self.pos = pos
+
+    def __reduce__(self):
+        return self.__class__, (str(self), self.pos)
+
+
+# Not native when compiled: native instances are larger than a plain dict
+@mypyc_attr(native_class=False)
+class FrozenDict(dict):
+    """
+    Read-only and hashable dict, see `freeze`
+
+    Mutating methods raise `TypeError`. It compares equal to a plain dict with
+    the same items.
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kw):
+        raise TypeError(f"{type(self).__name__} is read-only")
+
+    # Spelled out because mypyc does not support method aliases
+    def __setitem__(self, key, value):
+        self._readonly()
+
+    def __delitem__(self, key):
+        self._readonly()
+
+    def __ior__(self, other):  # type: ignore
+        self._readonly()
+
+    def clear(self):
+        self._readonly()
+
+    def pop(self, *args):
+        self._readonly()
+
+    def popitem(self):
+        self._readonly()
+
+    def setdefault(self, *args):
+        self._readonly()
+
+    def update(self, *args, **kw):
+        self._readonly()
+
+    def __hash__(self):  # type: ignore
+        return hash(frozenset(self.items()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict.__repr__(self)})"
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+
+def freeze(arg: Any) -> Any:
+    """Recursively convert lists to tuples and dicts to `FrozenDict`"""
+    if isinstance(arg, list):
+        return tuple(freeze(x) for x in arg)
+    if isinstance(arg, dict) and not isinstance(arg, FrozenDict):
+        return FrozenDict((k, freeze(v)) for k, v in arg.items())
+    return arg
+
+
+def _thaw(arg: Any) -> Any:
+    """Recursive copy of frozen data as lists and dicts"""
+    if isinstance(arg, tuple):
+        return [_thaw(x) for x in arg]
+    if isinstance(arg, dict):
+        return {k: _thaw(v) for k, v in arg.items()}
+    if _is_numpy_array(arg):
+        return arg.copy()
+    return arg
+
+
+def _load_hexdigit(arg: str, pos: int) -> int:
+    char = arg[pos]
+    if char >= "0" and char <= "9":
+        return ord(char) - ord("0")
+    elif char >= "a" and char <= "f":
+        return ord(char) - ord("a") + 10
+    elif char >= "A" and char <= "F":
+        return ord(char) - ord("A") + 10
+    else:
+        raise ParseError(f"Invalid hex digit {char!r} at pos {pos}", pos)
+
+
+def _load_percent(arg: str, pos: int) -> Tuple[str, int]:
+    start = pos
+    arr = []
+    while pos < len(arg) and arg[pos] == "%":
+        if pos + 2 >= len(arg):
+            raise ParseError(f"Unterminated percent at pos {pos}", pos)
+        arr.append(_load_hexdigit(arg, pos + 1) * 16 + _load_hexdigit(arg, pos + 2))
+        pos += 3
+    try:
+        return bytes(arr).decode("utf-8"), pos
+    except UnicodeDecodeError:
+        raise ParseError(f"Invalid UTF-8 percent-encoding at pos {start}", start)
+
+
+_UNENCODED_CHAR_LIST = (
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-._~!$*/;?@"
+)
+
+
+def _is_unencoded(char: str) -> bool:
+    """If one of the sharacters listed as "unencoded" in jsonurl spec"""
+    return char in _UNENCODED_CHAR_LIST
+
+
+_AQF_PARTIAL_DECODE_SET = set([ord("("), ord(")"), ord(","), ord(":"), ord("!")])
+
+
+def _partial_decode_aqf(arg: str) -> str:
+    """Perform partial percent decoding for AQF
+
+    Affects (),:!
+
+    All the characters involved are ascii so they can't be part of a multi-byte
+    character. Overlong encodings don't need handling either, they will reach
+    _load_percent and be rejected by the python utf-8 decoder.
+
+    This is done so that the rest of the parser can check for structural
+    characters without worrying about percent enconding.
+    """
+    # A list of parts because repeated += on the whole text is quadratic on PyPy
+    parts = []
+    spos = 0
+    while True:
+        epos = arg.find("%", spos)
+        if epos == -1:
+            parts.append(arg[spos:])
+            return "".join(parts)
+        if epos + 2 >= len(arg):
+            raise ParseError(f"Unterminated percent at pos {epos}", epos)
+        val = _load_hexdigit(arg, epos + 1) * 16 + _load_hexdigit(arg, epos + 2)
+        if val in _AQF_PARTIAL_DECODE_SET:
+            parts.append(arg[spos:epos])
+            parts.append(chr(val))
+        else:
+            parts.append(arg[spos : epos + 3])
+        spos = epos + 3
+
+
+def _unquote_aqf(arg: str) -> str:
+    if "!" not in arg:
+        return arg
+    parts = []
+    spos = 0
+    while True:
+        epos = arg.find("!", spos)
+        if epos == -1:
+            parts.append(arg[spos:])
+            return "".join(parts)
+        if epos == len(arg) - 1:
+            raise ParseError(f"Invalid trailing ! in atom {arg!r}")
+        eval = arg[epos + 1]
+        if eval in "():,0123456789+-!fnt":
+            parts.append(arg[spos:epos])
+            parts.append(eval)
+            spos = epos + 2
+        else:
+            raise ParseError(f"Invalid !-escaped char {hex(ord(eval))}")
 
 
 def _convert_unquoted_atom(arg: Optional[str], decstr: str, opts: LoadOpts) -> Any:
@@ -296,8 +1415,8 @@ def _convert_unquoted_atom(arg: Optional[str], decstr: str, opts: LoadOpts) -> A
             return True
         if arg == "false":
             return False
-        if re.match(RE_NUMBER, arg):
-            if re.match(RE_INT_NUMBER, arg):
+        if _match_number(arg):
+            if _match_int_number(arg):
                 return int(arg)
             else:
                 return float(arg)
@@ -310,249 +1429,1958 @@ def _convert_unquoted_atom(arg: Optional[str], decstr: str, opts: LoadOpts) -> A
         return decstr
 
 
-def _load_qstr(arg: str, pos: int) -> Tuple[str, int]:
-    """Parse a quoted string until the closing '"""
-    ret = ""
-    while True:
-        if pos == len(arg):
-            raise ParseError(f"Unterminated quoted string")
-        char = arg[pos]
-        if char == "%":
-            enc, pos = _load_percent(arg, pos)
-            ret += enc
-        elif char == "+":
-            ret += " "
-            pos += 1
-        elif char == "'":
-            return ret, pos + 1
-        elif _is_unencoded(char) or char in "(,:)":
-            ret += char
-            pos += 1
+def _check_max_string_length(ret: str, pos: int, opts: LoadOpts):
+    if opts.max_string_length is not None and len(ret) > opts.max_string_length:
+        raise ParseError(
+            f"Atom at pos {pos} exceeds max_string_length {opts.max_string_length}",
+            pos,
+        )
+
+
+# Atoms and quoted strings are matched as a whole, also by validate. Only
+# matched text containing percent-encoding or + is decoded, in runs. This avoids
+# appending single characters which is slow on CPython and very slow on PyPy.
+
+_RE_SKIP_ATOM = r"(?:[A-Za-z0-9\-._~!$*/;?@'+{}]|%[0-9A-Fa-f]{{2}})+"
+_RE_SKIP_ATOM_AQF = r"(?:[A-Za-z0-9\-._~$*/;?@'+{}]|%[0-9A-Fa-f]{{2}}|![(),:!]?)+"
+_RE_SKIP_QSTR = r"(?:[A-Za-z0-9\-._~!$*/;?@(),:+{}]|%[0-9A-Fa-f]{{2}})*'"
+_match_skip_atom = _lazy_regex("_match_skip_atom", _RE_SKIP_ATOM.format(""))
+_match_skip_atom_aqf = _lazy_regex("_match_skip_atom_aqf", _RE_SKIP_ATOM_AQF.format(""))
+_match_skip_qstr = _lazy_regex("_match_skip_qstr", _RE_SKIP_QSTR.format(""))
+_match_skip_atom_iri = _lazy_regex(
+    "_match_skip_atom_iri", _RE_SKIP_ATOM.format(_IRI_CHAR_RANGES)
+)
+_match_skip_atom_aqf_iri = _lazy_regex(
+    "_match_skip_atom_aqf_iri", _RE_SKIP_ATOM_AQF.format(_IRI_CHAR_RANGES)
+)
+_match_skip_qstr_iri = _lazy_regex(
+    "_match_skip_qstr_iri", _RE_SKIP_QSTR.format(_IRI_CHAR_RANGES)
+)
+_finditer_percent_run = _lazy_regex(
+    "_finditer_percent_run", r"(?:%[0-9A-Fa-f]{2})+", "finditer"
+)
+
+
+def _decode_percent_run(arg: str, match: Match) -> str:
+    """Decode a match of `_finditer_percent_run`, raise like `_load_percent`"""
+    if arg[match.end() : match.end() + 1] == "%":
+        # run continues with bad percent-encoding, raises
+        _load_percent(arg, match.start())
+    try:
+        return bytes.fromhex(match.group().replace("%", "")).decode("utf-8")
+    except UnicodeDecodeError:
+        raise ParseError(
+            f"Invalid UTF-8 percent-encoding at pos {match.start()}",
+            match.start(),
+        )
+
+
+def _decode_atom(arg: str, pos: int, end: int) -> str:
+    """Decode percent-encoding and + in arg[pos:end] matched as an atom"""
+    # The regex match guarantees two hex digits after each %
+    first, *rest = arg[pos:end].replace("+", " ").split("%")
+    buf = bytearray(first.encode())
+    for part in rest:
+        buf.append(int(part[:2], 16))
+        buf += part[2:].encode()
+    try:
+        return buf.decode("utf-8")
+    except UnicodeDecodeError:
+        # find the invalid run for the error position
+        for match in _finditer_percent_run(arg, pos, end):
+            _decode_percent_run(arg, match)
+        raise  # pragma: no cover
+
+
+def _load_qstr(arg: str, pos: int, opts: LoadOpts) -> Tuple[str, int]:
+    """Parse a quoted string until the closing '"""
+    if opts.iri:
+        match = _match_skip_qstr_iri(arg, pos)
+    else:
+        match = _match_skip_qstr(arg, pos)
+    if match is None:
+        # let the character by character parser produce the exact error
+        return _load_qstr_chars(arg, pos, opts)
+    end = match.end()
+    ret = arg[pos : end - 1]
+    if "%" in ret or "+" in ret:
+        ret = _decode_atom(arg, pos, end - 1)
+    if opts.max_string_length is not None:
+        _check_max_string_length(ret, pos - 1, opts)
+    return ret, end
+
+
+def _load_qstr_chars(arg: str, pos: int, opts: LoadOpts) -> Tuple[str, int]:
+    start = pos - 1
+    ret = ""
+    while True:
+        if pos == len(arg):
+            raise ParseError(f"Unterminated quoted string", pos)
+        char = arg[pos]
+        if char == "%":
+            enc, pos = _load_percent(arg, pos)
+            ret += enc
+        elif char == "+":
+            ret += " "
+            pos += 1
+        elif char == "'":
+            if opts.max_string_length is not None:
+                _check_max_string_length(ret, start, opts)
+            return ret, pos + 1
+        elif (
+            _is_unencoded(char)
+            or char in "(,:)"
+            or (opts.iri and char >= "\xa0" and _match_iri_char(char))
+        ):
+            ret += char
+            pos += 1
+        else:
+            raise ParseError(
+                f"Unexpected char {char!r} in quoted string at pos {pos}", pos
+            )
+
+
+def _load_atom(arg: str, pos: int, opts: LoadOpts) -> Tuple[Any, int]:
+    """Parse an atom: string, int, bool, null"""
+    if pos == len(arg):
+        raise ParseError(f"Unexpected empty value at pos {pos}", pos)
+    if arg[pos] == "'" and not opts.aqf:
+        return _load_qstr(arg, pos + 1, opts)
+    if opts.iri:
+        match = (_match_skip_atom_aqf_iri if opts.aqf else _match_skip_atom_iri)(
+            arg, pos
+        )
+    elif opts.aqf:
+        match = _match_skip_atom_aqf(arg, pos)
+    else:
+        match = _match_skip_atom(arg, pos)
+    end = pos if match is None else match.end()
+    ret = arg[pos:end]
+    # raw is the text without decoding to check for unquoted atoms
+    raw: Optional[str] = ret
+    if "%" in ret:
+        ret = _decode_atom(arg, pos, end)
+        # no unquoted atom contains a percent
+        raw = None
+    elif "+" in ret:
+        ret = ret.replace("+", " ")
+    if end < len(arg) and arg[end] == "%":
+        # bad percent-encoding, raises
+        _load_percent(arg, end)
+    if end == pos:
+        raise ParseError(f"Unexpected empty value at pos {pos}", pos)
+    if opts.max_string_length is not None:
+        _check_max_string_length(ret, pos, opts)
+    return _convert_unquoted_atom(raw, ret, opts), end
+
+
+# Lists of plain numbers are matched as a whole when LoadOpts.numpy_dtype is set
+_RE_INT_ITEM = r"-?\d+"
+_RE_NUMBER_ITEM = r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?"
+_match_int_list = _lazy_regex(
+    "_match_int_list", _RE_INT_ITEM + "(?:," + _RE_INT_ITEM + ")*"
+)
+_match_number_list = _lazy_regex(
+    "_match_number_list", _RE_NUMBER_ITEM + "(?:," + _RE_NUMBER_ITEM + ")*"
+)
+_search_long_digits = _lazy_regex("_search_long_digits", r"\d{19}", "search")
+_numpy_dtype_kinds: Dict[Any, str] = {}
+
+
+def _match_numpy_list(arg: str, pos: int, opts: LoadOpts) -> Optional[Match]:
+    kind = _numpy_dtype_kinds.get(opts.numpy_dtype)
+    if kind is None:
+        import numpy
+
+        kind = numpy.dtype(opts.numpy_dtype).kind
+        if kind not in "iuf":
+            raise ValueError(f"numpy_dtype must be numeric, not {opts.numpy_dtype}")
+        _numpy_dtype_kinds[opts.numpy_dtype] = kind
+    if kind == "f":
+        return _match_number_list(arg, pos)
+    return _match_int_list(arg, pos)
+
+
+def _load_numpy_array(text: str, pos: int, opts: LoadOpts) -> Any:
+    """Convert a list matched by `_match_numpy_list` at pos"""
+    import numpy
+
+    dtype = numpy.dtype(opts.numpy_dtype)
+    if opts.max_items is not None and text.count(",") >= opts.max_items:
+        _raise_max_items(pos, opts)
+    if opts.max_string_length is not None:
+        match = re.search(f"[^,]{{{opts.max_string_length + 1}}}", text)
+        if match:
+            _check_max_string_length(match.group(), pos + match.start(), opts)
+    if dtype.kind == "f":
+        return numpy.fromstring(text, dtype, sep=",")
+    else:
+        if _search_long_digits(text):
+            # fromstring saturates at the limits of int64
+            values = numpy.array([int(x) for x in text.split(",")], object)
+        else:
+            values = numpy.fromstring(text, numpy.int64, sep=",")
+        info = numpy.iinfo(dtype)
+        if values.min() < info.min or values.max() > info.max:
+            raise ParseError(f"List at pos {pos} out of range for {dtype}", pos)
+        return values.astype(dtype)
+
+
+def _raise_max_items(pos: int, opts: LoadOpts):
+    raise ParseError(f"More than max_items {opts.max_items} at pos {pos}", pos)
+
+
+def _raise_max_depth(pos: int, opts: LoadOpts):
+    raise ParseError(f"Value at pos {pos} exceeds max_depth {opts.max_depth}", pos)
+
+
+def _load_list_data(arg: str, pos: int, opts: LoadOpts) -> Any:
+    """Parse an implied list"""
+    ret: List[Any] = []
+    if pos == len(arg):
+        return tuple(ret) if opts.frozen else ret
+    if opts.numpy_dtype is not None:
+        match = _match_numpy_list(arg, pos, opts)
+        if match and match.end() == len(arg):
+            return _load_numpy_array(match.group(), pos, opts)
+    while True:
+        item, pos = _load_any(arg, pos, opts, 1)
+        ret.append(item)
+        if opts.max_items is not None and len(ret) > opts.max_items:
+            _raise_max_items(pos, opts)
+        if pos == len(arg):
+            return tuple(ret) if opts.frozen else ret
+        char = arg[pos]
+        if char == ",":
+            pos += 1
+            continue
+        raise ParseError(f"Unexpected char {char!r} at pos {pos} in list", pos)
+
+
+def _load_list(
+    arg: str, pos: int, first_element: Any, opts: LoadOpts, depth: int
+) -> Tuple[Any, int]:
+    """Parse a list. pos points after the first item"""
+    ret = [first_element]
+    if opts.max_items is not None and len(ret) > opts.max_items:
+        _raise_max_items(pos, opts)
+    while True:
+        if pos == len(arg):
+            raise ParseError(f"Unterminated list", pos)
+        char = arg[pos]
+        if char == ")":
+            return tuple(ret) if opts.frozen else ret, pos + 1
+        if char == ",":
+            pos += 1
+            item, pos = _load_any(arg, pos, opts, depth)
+            ret.append(item)
+            if opts.max_items is not None and len(ret) > opts.max_items:
+                _raise_max_items(pos, opts)
+            continue
+        raise ParseError(f"Unexpected char {char!r} at pos {pos} in list", pos)
+
+
+def _load_dict(
+    arg: str, pos: int, first_key: Any, opts: LoadOpts, depth: int
+) -> Tuple[dict, int]:
+    first_val, pos = _load_any(arg, pos, opts, depth)
+    ret = {first_key: first_val}
+    if opts.max_items is not None and len(ret) > opts.max_items:
+        _raise_max_items(pos, opts)
+    while True:
+        if pos == len(arg):
+            raise ParseError(f"Unterminated dict", pos)
+        char = arg[pos]
+        if char == ")":
+            return FrozenDict(ret) if opts.frozen else ret, pos + 1
+        if char == ",":
+            pos += 1
+        key, pos = _load_atom(arg, pos, opts)
+        if pos == len(arg):
+            raise ParseError(f"Unterminated dict, missing value", pos)
+        char = arg[pos]
+        if char != ":":
+            raise ParseError(f"Unexpected char {char!r} at pos {pos}, expected :", pos)
+        pos += 1
+        val, pos = _load_any(arg, pos, opts, depth)
+        ret[key] = val
+        if opts.max_items is not None and len(ret) > opts.max_items:
+            _raise_max_items(pos, opts)
+
+
+def _load_comp(arg: str, pos: int, opts: LoadOpts, depth: int) -> Tuple[Any, int]:
+    """Parse a composite: list or dict"""
+    val, pos = _load_atom(arg, pos, opts)
+    if pos == len(arg):
+        raise ParseError("Unterminated composite", pos)
+    char = arg[pos]
+    if char == ":":
+        pos += 1
+        return _load_dict(arg, pos, val, opts, depth)
+    if char == ",":
+        return _load_list(arg, pos, val, opts, depth)
+    if char == ")":
+        return _load_list(arg, pos, val, opts, depth)
+    raise ParseError(f"Unexpected char {char} at pos {pos}, expected , or :", pos)
+
+
+def _load_any(arg: str, pos: int, opts: LoadOpts, depth: int) -> Tuple[Any, int]:
+    """Parse any value, depth is that of the enclosing composite"""
+    if pos == len(arg):
+        raise ParseError(f"Unexpected end of input", pos)
+    if arg[pos] == "(":
+        start = pos
+        depth += 1
+        if opts.max_depth is not None and depth > opts.max_depth:
+            _raise_max_depth(pos, opts)
+        pos += 1
+        if pos == len(arg):
+            raise ParseError("Unterminated composite, expected value", pos)
+        if opts.numpy_dtype is not None:
+            match = _match_numpy_list(arg, pos, opts)
+            if match and arg.startswith(")", match.end()):
+                return _load_numpy_array(match.group(), pos, opts), match.end() + 1
+        char = arg[pos]
+        ret: Any
+        if char == "(":
+            first_val, pos = _load_any(arg, pos, opts, depth)
+            ret, pos = _load_list(arg, pos, first_val, opts, depth)
+        elif opts.distinguish_empty_list_dict and char == ":":
+            pos += 1
+            if pos == len(arg):
+                raise ParseError("Unterminated empty composite, expected )", pos)
+            char = arg[pos]
+            if char == ")":
+                ret, pos = FrozenDict() if opts.frozen else {}, pos + 1
+            else:
+                raise ParseError("Unterminated empty composite, expected )", pos)
+        elif char == ")":
+            if opts.distinguish_empty_list_dict:
+                ret, pos = () if opts.frozen else [], pos + 1
+            else:
+                ret, pos = FrozenDict() if opts.frozen else {}, pos + 1
+        else:
+            ret, pos = _load_comp(arg, pos, opts, depth)
+        if opts.dedup:
+            return _load_shared(arg, start, pos, ret, opts), pos
+        return ret, pos
+    else:
+        return _load_atom(arg, pos, opts)
+
+
+class _SharedLoadOpts(LoadOpts):
+    """Options of a single `loads` call with `LoadOpts.dedup`"""
+
+    # memo is set up here, an extra dataclass would cost import time
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.memo: Dict[int, Tuple[int, int, Any]] = {}
+        """First composite parsed with each text hash, with its span"""
+
+
+def _load_shared(arg: str, start: int, end: int, ret: Any, opts: Any) -> Any:
+    """Return the first composite parsed from the same text as arg[start:end]
+
+    The memo keeps spans rather than copies of the text, those would add up to
+    the length of the input times the nesting depth.
+    """
+    text = arg[start:end]
+    key = hash(text)
+    first = opts.memo.get(key)
+    if first is None:
+        opts.memo[key] = start, end, ret
+        return ret
+    first_start, first_end, first_ret = first
+    if first_end - first_start == end - start and arg.startswith(text, first_start):
+        return first_ret
+    # hash collision, rare enough to not share
+    return ret
+
+
+def _load_top(arg: str, pos: int, opts: LoadOpts) -> Any:
+    ret, pos = _load_any(arg, pos, opts, 0)
+    if pos != len(arg):
+        char = arg[pos]
+        raise ParseError(f"Expected end of input at {pos}, got {char!r}", pos)
+    return ret
+
+
+def _load_dict_data(arg: str, pos: int, opts: LoadOpts) -> dict:
+    ret: Dict[str, Any] = {}
+    if pos == len(arg):
+        return FrozenDict(ret) if opts.frozen else ret
+    while True:
+        key, pos = _load_atom(arg, pos, opts)
+        if pos == len(arg):
+            raise ParseError(f"Unterminated dict, missing value", pos)
+        char = arg[pos]
+        if char != ":":
+            raise ParseError(f"Unexpected char {char!r} at pos {pos}, expected :", pos)
+        pos += 1
+        val, pos = _load_any(arg, pos, opts, 1)
+        ret[key] = val
+        if opts.max_items is not None and len(ret) > opts.max_items:
+            _raise_max_items(pos, opts)
+        if pos == len(arg):
+            return FrozenDict(ret) if opts.frozen else ret
+        char = arg[pos]
+        if char != ",":
+            raise ParseError(
+                f"Unexpected char {char!r} at pos {pos}, expected , or end of input",
+                pos,
+            )
+        pos += 1
+
+
+def _check_max_input_length(arg: str, opts: LoadOpts):
+    if opts.max_input_length is not None and len(arg) > opts.max_input_length:
+        raise ParseError(
+            f"Input length {len(arg)} exceeds max_input_length {opts.max_input_length}",
+            opts.max_input_length,
+        )
+
+
+def _load_text(arg: str, opts: LoadOpts) -> Any:
+    """Parse text, already partially decoded if AQF"""
+    if opts.dedup and not isinstance(opts, _SharedLoadOpts):
+        opts = _SharedLoadOpts(**{**_opts_dict(opts), "frozen": True})
+    if opts.implied_dict:
+        return _load_dict_data(arg, 0, opts)
+    if opts.implied_list:
+        return _load_list_data(arg, 0, opts)
+    return _load_top(arg, 0, opts)
+
+
+def _load_stats(arg: str, opts: LoadOpts, stats: Stats) -> Any:
+    stats.calls += 1
+    stats.input_length += len(arg)
+    stats.percent_bytes += arg.count("%")
+    start = perf_counter()
+    if opts.aqf:
+        arg = _partial_decode_aqf(arg)
+        now = perf_counter()
+        stats._add_time("aqf_decode", now - start)
+        start = now
+    ret = _load_text(arg, opts)
+    stats._add_time("parse", perf_counter() - start)
+    _scan_stats(arg, opts, stats)
+    return ret
+
+
+def _load_hooked(
+    arg: str, opts: LoadOpts, stats: Optional[Stats], hook: SlowHook
+) -> Any:
+    error = None
+    start = perf_counter()
+    try:
+        if stats is not None:
+            return _load_stats(arg, opts, stats)
+        if opts.aqf:
+            return _load_text(_partial_decode_aqf(arg), opts)
+        return _load_text(arg, opts)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        _fire_slow_hook(hook, "loads", arg, opts, perf_counter() - start, error)
+
+
+@overload
+def loads(
+    arg: str, opts: Optional[LoadOpts] = None, *, stats: Optional[Stats] = None
+) -> Any: ...
+
+
+@overload
+def loads(
+    arg: str,
+    *,
+    stats: Optional[Stats] = None,
+    implied_dict: bool = False,
+    implied_list: bool = False,
+    aqf: bool = False,
+    iri: bool = False,
+    distinguish_empty_list_dict: bool = False,
+    slow_hook: Optional[SlowHook] = None,
+    max_input_length: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    max_items: Optional[int] = None,
+    max_string_length: Optional[int] = None,
+    frozen: bool = False,
+    dedup: bool = False,
+    numpy_dtype: Any = None,
+) -> Any: ...
+
+
+def loads(arg: str, opts=None, *, stats=None, **kw) -> Any:
+    """
+    Convert a json object into a jsonurl string
+
+    Options can be passed as a `LoadOpts` object or as individual keyword arguments.
+
+    If a `Stats` object is passed then counters are added to it.
+    """
+    if opts is None:
+        opts = LoadOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    if opts.max_input_length is not None:
+        _check_max_input_length(arg, opts)
+
+    hook = opts.slow_hook or _slow_hook
+    if hook is not None:
+        return _load_hooked(arg, opts, stats, hook)
+    if stats is not None:
+        return _load_stats(arg, opts, stats)
+    if opts.aqf:
+        arg = _partial_decode_aqf(arg)
+    return _load_text(arg, opts)
+
+
+# Canonicalization mirrors the _load_* functions but produces the output of
+# dumps with sort_keys directly. Plain atoms are copied without decoding.
+
+# atoms which dumps would output unchanged: plain words and integers
+_match_canon_atom = _lazy_regex(
+    "_match_canon_atom", r"[A-Za-z_.~][A-Za-z0-9_.~-]*|0|-?[1-9][0-9]*"
+)
+
+
+def _canon_atom(arg: str, pos: int, opts: LoadOpts, dopts: DumpOpts) -> Tuple[str, int]:
+    if opts.max_string_length is None:
+        match = _match_canon_atom(arg, pos)
+        if match is not None:
+            end = match.end()
+            if end == len(arg) or arg[end] in "(),:":
+                return match.group(), end
+    val, pos = _load_atom(arg, pos, opts)
+    return _dump_any(val, dopts), pos
+
+
+def _canon_items(
+    arg: str, pos: int, opts: LoadOpts, dopts: DumpOpts, depth: int, first: str
+) -> Tuple[str, int]:
+    """Canonical list items like `_load_list`, pos points after the first item"""
+    items = [first]
+    while True:
+        if pos == len(arg):
+            raise ParseError(f"Unterminated list", pos)
+        char = arg[pos]
+        if char == ")":
+            return ",".join(items), pos + 1
+        if char != ",":
+            raise ParseError(f"Unexpected char {char!r} at pos {pos} in list", pos)
+        item, pos = _canon_any(arg, pos + 1, opts, dopts, depth)
+        items.append(item)
+        if opts.max_items is not None and len(items) > opts.max_items:
+            _raise_max_items(pos, opts)
+
+
+def _canon_join_dict(items: Dict[Any, Tuple[str, str]]) -> str:
+    return ",".join([k + ":" + v for k, v in sorted(items.values(), key=_first_item)])
+
+
+def _canon_pair(
+    arg: str, pos: int, opts: LoadOpts, dopts: DumpOpts, depth: int, items: dict
+) -> int:
+    """Add one dict item, keys are decoded so duplicates match loads"""
+    key, pos = _load_atom(arg, pos, opts)
+    if pos == len(arg):
+        raise ParseError(f"Unterminated dict, missing value", pos)
+    char = arg[pos]
+    if char != ":":
+        raise ParseError(f"Unexpected char {char!r} at pos {pos}, expected :", pos)
+    val, pos = _canon_any(arg, pos + 1, opts, dopts, depth)
+    # like dict assignment the first key object is kept and the value replaced
+    item = items.get(key)
+    items[key] = (_dump_any(key, dopts) if item is None else item[0], val)
+    if opts.max_items is not None and len(items) > opts.max_items:
+        _raise_max_items(pos, opts)
+    return pos
+
+
+def _canon_dict(
+    arg: str, pos: int, opts: LoadOpts, dopts: DumpOpts, depth: int
+) -> Tuple[str, int]:
+    """Canonical dict items like `_load_dict`, pos points at the first key"""
+    items: Dict[Any, Tuple[str, str]] = {}
+    pos = _canon_pair(arg, pos, opts, dopts, depth, items)
+    while True:
+        if pos == len(arg):
+            raise ParseError(f"Unterminated dict", pos)
+        char = arg[pos]
+        if char == ")":
+            return _canon_join_dict(items), pos + 1
+        if char == ",":
+            pos += 1
+        pos = _canon_pair(arg, pos, opts, dopts, depth, items)
+
+
+def _canon_any(
+    arg: str, pos: int, opts: LoadOpts, dopts: DumpOpts, depth: int
+) -> Tuple[str, int]:
+    """Canonical form of any value like `_load_any`"""
+    if pos == len(arg):
+        raise ParseError(f"Unexpected end of input", pos)
+    if arg[pos] != "(":
+        return _canon_atom(arg, pos, opts, dopts)
+    depth += 1
+    if opts.max_depth is not None and depth > opts.max_depth:
+        _raise_max_depth(pos, opts)
+    start = pos
+    pos += 1
+    if pos == len(arg):
+        raise ParseError("Unterminated composite, expected value", pos)
+    char = arg[pos]
+    if char == "(":
+        first, pos = _canon_any(arg, pos, opts, dopts, depth)
+        ret, pos = _canon_items(arg, pos, opts, dopts, depth, first)
+        return "(" + ret + ")", pos
+    if opts.distinguish_empty_list_dict and char == ":":
+        pos += 1
+        if pos == len(arg) or arg[pos] != ")":
+            raise ParseError("Unterminated empty composite, expected )", pos)
+        return "(:)", pos + 1
+    if char == ")":
+        return "()", pos + 1
+    first, pos = _canon_atom(arg, pos, opts, dopts)
+    if pos == len(arg):
+        raise ParseError("Unterminated composite", pos)
+    char = arg[pos]
+    if char == ":":
+        # go back and decode the key
+        ret, pos = _canon_dict(arg, start + 1, opts, dopts, depth)
+    elif char == "," or char == ")":
+        ret, pos = _canon_items(arg, pos, opts, dopts, depth, first)
+    else:
+        raise ParseError(f"Unexpected char {char} at pos {pos}, expected , or :", pos)
+    return "(" + ret + ")", pos
+
+
+def _canon_text(arg: str, opts: LoadOpts, dopts: DumpOpts) -> str:
+    if opts.implied_dict:
+        items: Dict[Any, Tuple[str, str]] = {}
+        pos = 0
+        while arg:
+            pos = _canon_pair(arg, pos, opts, dopts, 1, items)
+            if pos == len(arg):
+                break
+            char = arg[pos]
+            if char != ",":
+                raise ParseError(
+                    f"Unexpected char {char!r} at pos {pos}, expected , or end of input",
+                    pos,
+                )
+            pos += 1
+        return _canon_join_dict(items)
+    if opts.implied_list:
+        if not arg:
+            return ""
+        ret, pos = _canon_any(arg, 0, opts, dopts, 1)
+        values = [ret]
+        while pos != len(arg):
+            char = arg[pos]
+            if char != ",":
+                raise ParseError(f"Unexpected char {char!r} at pos {pos} in list", pos)
+            ret, pos = _canon_any(arg, pos + 1, opts, dopts, 1)
+            values.append(ret)
+            if opts.max_items is not None and len(values) > opts.max_items:
+                _raise_max_items(pos, opts)
+        return ",".join(values)
+    ret, pos = _canon_any(arg, 0, opts, dopts, 0)
+    if pos != len(arg):
+        char = arg[pos]
+        raise ParseError(f"Expected end of input at {pos}, got {char!r}", pos)
+    return ret
+
+
+def canonicalize(arg: str, opts: Optional[LoadOpts] = None, **kw) -> str:
+    """
+    Normalize jsonurl text, for example to use it as a cache key
+
+    The result is the same as ``dumps(loads(arg), sort_keys=True)`` with the
+    same format options: keys are sorted, quoting is minimal and percent
+    escapes are uppercase. It is computed in a single pass over the text
+    without building lists and dicts.
+    """
+    if opts is None:
+        opts = LoadOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    if opts.max_input_length is not None:
+        _check_max_input_length(arg, opts)
+    dopts = DumpOpts(
+        implied_list=opts.implied_list,
+        implied_dict=opts.implied_dict,
+        distinguish_empty_list_dict=opts.distinguish_empty_list_dict,
+        aqf=opts.aqf,
+        iri=opts.iri,
+        sort_keys=True,
+    )
+    if opts.aqf:
+        arg = _partial_decode_aqf(arg)
+    return _canon_text(arg, opts, dopts)
+
+
+class LoadsCache:
+    """
+    Bounded LRU cache of `loads` results keyed by text and options
+
+    Cached values are shared between callers so they are returned frozen, see
+    `LoadOpts.frozen`, unless ``copy`` is set in which case each call gets a fresh copy
+    made of lists and dicts. Errors are not cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, copy: bool = False):
+        self.maxsize = maxsize
+        """Maximum number of cached results, older ones are evicted first"""
+        self.copy = copy
+        """Return mutable copies instead of frozen results"""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: Dict[Any, Any] = {}
+
+    def loads(self, arg: str, opts: Optional[LoadOpts] = None, **kw) -> Any:
+        """Same as `jsonurl_py.loads` but cached"""
+        if opts is None:
+            opts = LoadOpts(**kw)
+        elif kw:
+            raise ValueError("Either opts or kw, not both")
+        key = (arg, *_opts_values(opts))
+        data = self._data
+        try:
+            # pop and insert again to mark as most recently used
+            ret = data.pop(key)
+        except KeyError:
+            self.misses += 1
+            ret = loads(arg, opts if opts.frozen else replace(opts, frozen=True))
+            while len(data) >= self.maxsize > 0:
+                data.pop(next(iter(data)), None)
+                self.evictions += 1
+        else:
+            self.hits += 1
+        if self.maxsize > 0:
+            data[key] = ret
+        return _thaw(ret) if self.copy else ret
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of calls answered from the cache"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self):
+        """Remove all cached results, counters are kept"""
+        self._data.clear()
+
+
+_search_struct = _lazy_regex("_search_struct", r"[(),:']", "search")
+_search_struct_aqf = _lazy_regex("_search_struct_aqf", r"[(),:!]", "search")
+
+
+class StructuralIndex:
+    """
+    Positions of the structural characters ``(),:`` in jsonurl text
+
+    Built in one pass by `loads_lazy` and shared by all the lazy views over the
+    same text. Quoted strings and AQF escapes are skipped, AQF text is stored
+    partially decoded.
+    """
+
+    def __init__(self, text: str, opts: LoadOpts):
+        if opts.max_input_length is not None:
+            _check_max_input_length(text, opts)
+        if opts.aqf:
+            text = _partial_decode_aqf(text)
+        self.text = text
+        """Indexed text"""
+        self.opts = opts
+        """Options used to decode values"""
+        from array import array
+
+        self.positions = array("q")
+        """Offsets of structural characters in `text`"""
+        self.matches = array("q")
+        """For parens the entry of the matching paren, -1 for other entries"""
+        self._build()
+
+    def _build(self):
+        text = self.text
+        positions = self.positions
+        matches = self.matches
+        search = _search_struct_aqf if self.opts.aqf else _search_struct
+        stack: List[int] = []
+        # start of the current atom, quotes only count there
+        atom_pos = 0
+        pos = 0
+        while True:
+            match = search(text, pos)
+            if match is None:
+                break
+            char = match.group()
+            pos = match.end()
+            if char == "!":
+                pos += 1
+                continue
+            if char == "'":
+                if match.start() == atom_pos:
+                    # unterminated strings are reported when decoded
+                    pos = text.find("'", pos) + 1 or len(text)
+                continue
+            atom_pos = pos
+            if char == "(":
+                stack.append(len(positions))
+                matches.append(-1)
+            elif char == ")":
+                if not stack:
+                    raise ParseError(f"Unexpected char ')' at pos {pos - 1}", pos - 1)
+                entry = stack.pop()
+                matches[entry] = len(positions)
+                matches.append(entry)
+            else:
+                matches.append(-1)
+            positions.append(pos - 1)
+        if stack:
+            raise ParseError("Unterminated composite", len(text))
+
+    def _children(self, first: int, last: int, start: int, end: int):
+        """Separators and value spans between entries first and last
+
+        Spans are ``(start, end, entry)`` tuples where entry is the index of
+        the opening paren if the value starts with one, otherwise -1.
+        """
+        text = self.text
+        positions = self.positions
+        matches = self.matches
+        seps = []
+        spans = []
+        child = -1
+        entry = first
+        while entry < last:
+            pos = positions[entry]
+            char = text[pos]
+            if char == "(":
+                if pos == start:
+                    child = entry
+                entry = matches[entry] + 1
+                continue
+            seps.append(pos)
+            spans.append((start, pos, child))
+            start = pos + 1
+            child = -1
+            entry += 1
+        spans.append((start, end, child))
+        return seps, spans
+
+    def _value(self, span: Tuple[int, int, int]) -> Any:
+        start, end, entry = span
+        text = self.text
+        if entry < 0:
+            val, pos = _load_atom(text, start, self.opts)
+        else:
+            last = self.matches[entry]
+            val = self._view(entry, last)
+            pos = self.positions[last] + 1
+        if pos != end:
+            raise ParseError(f"Unexpected char {text[pos]!r} at pos {pos}", pos)
+        return val
+
+    def _view(self, first: int, last: int) -> Any:
+        """Lazy view of the composite between paren entries first and last"""
+        text = self.text
+        start = self.positions[first] + 1
+        end = self.positions[last]
+        if start == end:
+            if self.opts.distinguish_empty_list_dict:
+                return LazyList(self, start - 1, [], [])
+            return LazyDict(self, start - 1, [], [])
+        seps, spans = self._children(first + 1, last, start, end)
+        if self.opts.distinguish_empty_list_dict and end == start + 1:
+            if text[start] == ":":
+                return LazyDict(self, start - 1, [], [])
+        if seps and text[seps[0]] == ":":
+            return LazyDict(self, start - 1, seps, spans)
+        return LazyList(self, start - 1, seps, spans)
+
+    def root(self) -> Any:
+        """Top-level value: a lazy view for composites, decoded otherwise"""
+        text = self.text
+        opts = self.opts
+        if opts.implied_list or opts.implied_dict:
+            if not text:
+                seps, spans = [], []
+            else:
+                seps, spans = self._children(0, len(self.positions), 0, len(text))
+            if opts.implied_dict:
+                return LazyDict(self, -1, seps, spans)
+            return LazyList(self, -1, seps, spans)
+        if not text:
+            raise ParseError(f"Unexpected end of input", 0)
+        seps, spans = self._children(0, len(self.positions), 0, len(text))
+        if seps:
+            pos = seps[0]
+            raise ParseError(f"Expected end of input at {pos}, got {text[pos]!r}", pos)
+        return self._value(spans[0])
+
+
+_MISSING = object()
+
+
+class LazyList(Sequence):
+    """
+    Read-only list over jsonurl text, items are decoded on first access
+
+    Nested lists and dicts are returned as lazy views too. Compares equal to
+    the list returned by `loads`.
+    """
+
+    def __init__(self, index: StructuralIndex, start: int, seps: List[int], spans):
+        text = index.text
+        for pos in seps:
+            if text[pos] != ",":
+                raise ParseError(
+                    f"Unexpected char {text[pos]!r} at pos {pos} in list", pos
+                )
+        self._index = index
+        self._start = start
+        self._spans = spans
+        self._items = [_MISSING] * len(spans)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        val = self._items[i]
+        if val is _MISSING:
+            val = self._items[i] = self._index._value(self._spans[i])
+        return val
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self)!r})"
+
+    def to_python(self) -> Any:
+        """Decode everything with `loads`, including the limits in `LoadOpts`"""
+        return _load_lazy_view(self._index, self._start)
+
+
+class LazyDict(Mapping):
+    """
+    Read-only dict over jsonurl text, values are decoded on first access
+
+    Keys are decoded when the view is created. Nested lists and dicts are
+    returned as lazy views too. Compares equal to the dict returned by `loads`.
+    """
+
+    def __init__(self, index: StructuralIndex, start: int, seps: List[int], spans):
+        text = index.text
+        opts = index.opts
+        for i, pos in enumerate(seps):
+            char = text[pos]
+            if i % 2 == 0 and char != ":":
+                raise ParseError(
+                    f"Unexpected char {char!r} at pos {pos}, expected :", pos
+                )
+            if i % 2 == 1 and char != ",":
+                raise ParseError(
+                    f"Unexpected char {char!r} at pos {pos}, expected ,", pos
+                )
+        if len(spans) % 2:
+            pos = spans[-1][1]
+            raise ParseError(f"Unterminated dict, missing value", pos)
+        self._index = index
+        self._start = start
+        self._spans: Dict[Any, Tuple[int, int, int]] = {}
+        for i in range(0, len(spans), 2):
+            key_start, key_end, _ = spans[i]
+            key, pos = _load_atom(text, key_start, opts)
+            if pos != key_end:
+                raise ParseError(f"Unexpected char {text[pos]!r} at pos {pos}", pos)
+            self._spans[key] = spans[i + 1]
+        self._values: Dict[Any, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __iter__(self):
+        return iter(self._spans)
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            span = self._spans[key]
+        val = self._values[key] = self._index._value(span)
+        return val
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    def to_python(self) -> Any:
+        """Decode everything with `loads`, including the limits in `LoadOpts`"""
+        return _load_lazy_view(self._index, self._start)
+
+
+def _load_lazy_view(index: StructuralIndex, start: int) -> Any:
+    if start < 0:
+        return _load_text(index.text, index.opts)
+    return _load_any(index.text, start, index.opts, 0)[0]
+
+
+def loads_lazy(arg: str, opts: Optional[LoadOpts] = None, **kw) -> Any:
+    """
+    Index jsonurl text and return lazy views instead of lists and dicts
+
+    This is faster than `loads` when only a small part of a large document is
+    read. Errors are only detected in the parts that are decoded and the
+    ``max_depth``, ``max_items`` and ``max_string_length`` limits only apply to
+    ``to_python``. See `LazyList`, `LazyDict` and `StructuralIndex`.
+    """
+    if opts is None:
+        opts = LoadOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    return StructuralIndex(arg, opts).root()
+
+
+_TAPE_NULL = 0
+_TAPE_TRUE = 1
+_TAPE_FALSE = 2
+_TAPE_INT = 3
+_TAPE_BIGINT = 4
+_TAPE_FLOAT = 5
+_TAPE_STR = 6
+_TAPE_LIST = 7
+_TAPE_DICT = 8
+
+
+class Tape:
+    """
+    Parsed document as flat arrays, see `loads_tape`
+
+    Each value is an entry in three parallel arrays. Entries are laid out in
+    document order and dict entries alternate between keys and values.
+
+    ========== ============================= ==========================
+    tag        a                             b
+    ========== ============================= ==========================
+    null/bool  0                             0
+    int        the value                     0
+    big int    offset of digits in `pool`    number of digits
+    float      index in `floats`             0
+    string     offset in `pool`              length
+    list/dict  entry after the last item     number of items
+    ========== ============================= ==========================
+
+    Dict items with duplicate keys are all kept, the last one wins on lookup.
+    """
+
+    def __init__(self):
+        from array import array
+
+        self.tags = array("B")
+        """Type of each entry"""
+        self.a = array("q")
+        """First field of each entry"""
+        self.b = array("q")
+        """Second field of each entry"""
+        self.floats = array("d")
+        """Float values"""
+        self.pool = ""
+        """All strings concatenated"""
+        self._pool_parts: List[str] = []
+        self._pool_length = 0
+
+    def _open(self) -> int:
+        entry = len(self.tags)
+        self.tags.append(_TAPE_LIST)
+        self.a.append(0)
+        self.b.append(0)
+        return entry
+
+    def _close(self, entry: int, tag: int, count: int):
+        self.tags[entry] = tag
+        self.a[entry] = len(self.tags)
+        self.b[entry] = count
+
+    def _append_pool(self, tag: int, text: str):
+        self.tags.append(tag)
+        self.a.append(self._pool_length)
+        self.b.append(len(text))
+        self._pool_parts.append(text)
+        self._pool_length += len(text)
+
+    def _append_atom(self, val: Any):
+        if val is None:
+            tag, a = _TAPE_NULL, 0
+        elif val is True:
+            tag, a = _TAPE_TRUE, 0
+        elif val is False:
+            tag, a = _TAPE_FALSE, 0
+        elif isinstance(val, str):
+            return self._append_pool(_TAPE_STR, val)
+        elif isinstance(val, int):
+            if not -(2**63) <= val < 2**63:
+                return self._append_pool(_TAPE_BIGINT, str(val))
+            tag, a = _TAPE_INT, val
         else:
-            raise ParseError(f"Unexpected char {char!r} in quoted string at pos {pos}")
+            tag, a = _TAPE_FLOAT, len(self.floats)
+            self.floats.append(val)
+        self.tags.append(tag)
+        self.a.append(a)
+        self.b.append(0)
+
+    def _finish(self):
+        self.pool = "".join(self._pool_parts)
+        self._pool_parts = []
+
+    def _next(self, entry: int) -> int:
+        """Entry after the value starting at entry"""
+        if self.tags[entry] >= _TAPE_LIST:
+            return self.a[entry]
+        return entry + 1
+
+    def _atom(self, entry: int) -> Any:
+        tag = self.tags[entry]
+        if tag == _TAPE_STR:
+            a = self.a[entry]
+            return self.pool[a : a + self.b[entry]]
+        if tag == _TAPE_INT:
+            return self.a[entry]
+        if tag == _TAPE_FLOAT:
+            return self.floats[self.a[entry]]
+        if tag == _TAPE_BIGINT:
+            a = self.a[entry]
+            return int(self.pool[a : a + self.b[entry]])
+        return _TAPE_CONSTANTS[tag]
+
+    def value(self, entry: int = 0) -> Any:
+        """Value of an entry, lists and dicts are returned as `TapeView`"""
+        if self.tags[entry] >= _TAPE_LIST:
+            return TapeView(self, entry)
+        return self._atom(entry)
+
+    def to_python(self, entry: int = 0) -> Any:
+        """Build the same lists and dicts as `loads`"""
+        tag = self.tags[entry]
+        if tag < _TAPE_LIST:
+            return self._atom(entry)
+        end = self.a[entry]
+        entry += 1
+        if tag == _TAPE_LIST:
+            ret = []
+            while entry < end:
+                ret.append(self.to_python(entry))
+                entry = self._next(entry)
+            return ret
+        dret = {}
+        while entry < end:
+            key = self._atom(entry)
+            dret[key] = self.to_python(entry + 1)
+            entry = self._next(entry + 1)
+        return dret
 
 
-def _load_atom(arg: str, pos: int, opts: LoadOpts) -> Tuple[Any, int]:
-    """Parse an atom: string, int, bool, null"""
-    # on-the-fly decoding into ret
-    ret = ""
-    # raw contains the string without decoding to check for unquoted atoms.
-    raw: Optional[str] = ""
+_TAPE_CONSTANTS = (None, True, False)
+
+
+class TapeView:
+    """
+    List or dict inside a `Tape`
+
+    Lists are indexed by position and iterate over values, dicts are indexed
+    by key and iterate over keys. Lookups walk the items so they take linear
+    time, use `to_python` for repeated random access.
+    """
+
+    __slots__ = ("tape", "entry")
+
+    def __init__(self, tape: Tape, entry: int):
+        self.tape = tape
+        self.entry = entry
+
+    @property
+    def is_dict(self) -> bool:
+        return self.tape.tags[self.entry] == _TAPE_DICT
+
+    def __len__(self) -> int:
+        return self.tape.b[self.entry]
+
+    def _entries(self):
+        """Entries of the items, for dicts those of the keys"""
+        tape = self.tape
+        step = 2 if self.is_dict else 1
+        end = tape.a[self.entry]
+        entry = self.entry + 1
+        while entry < end:
+            yield entry
+            for _ in range(step):
+                entry = tape._next(entry)
+
+    def __iter__(self):
+        if self.is_dict:
+            return (self.tape._atom(entry) for entry in self._entries())
+        return (self.tape.value(entry) for entry in self._entries())
+
+    def items(self):
+        """Key and value pairs of a dict"""
+        tape = self.tape
+        return ((tape._atom(e), tape.value(e + 1)) for e in self._entries())
+
+    def __getitem__(self, key):
+        tape = self.tape
+        if self.is_dict:
+            found = None
+            for entry in self._entries():
+                if tape._atom(entry) == key:
+                    found = entry + 1
+            if found is None:
+                raise KeyError(key)
+            return tape.value(found)
+        if key < 0:
+            key += len(self)
+        if 0 <= key < len(self):
+            for index, entry in enumerate(self._entries()):
+                if index == key:
+                    return tape.value(entry)
+        raise IndexError("TapeView index out of range")
+
+    def to_python(self) -> Any:
+        """Build the same list or dict as `loads`"""
+        return self.tape.to_python(self.entry)
+
+
+def _tape_any(arg: str, pos: int, opts: LoadOpts, tape: Tape, depth: int) -> int:
+    """Parse any value into the tape like `_load_any`"""
+    if pos == len(arg):
+        raise ParseError(f"Unexpected end of input", pos)
+    if arg[pos] != "(":
+        val, pos = _load_atom(arg, pos, opts)
+        tape._append_atom(val)
+        return pos
+    depth += 1
+    if opts.max_depth is not None and depth > opts.max_depth:
+        _raise_max_depth(pos, opts)
+    pos += 1
+    if pos == len(arg):
+        raise ParseError("Unterminated composite, expected value", pos)
+    entry = tape._open()
+    char = arg[pos]
+    if opts.distinguish_empty_list_dict and char == ":":
+        pos += 1
+        if pos == len(arg) or arg[pos] != ")":
+            raise ParseError("Unterminated empty composite, expected )", pos)
+        tape._close(entry, _TAPE_DICT, 0)
+        return pos + 1
+    if char == ")":
+        empty_tag = _TAPE_LIST if opts.distinguish_empty_list_dict else _TAPE_DICT
+        tape._close(entry, empty_tag, 0)
+        return pos + 1
+    first_composite = char == "("
+    pos = _tape_any(arg, pos, opts, tape, depth)
     if pos == len(arg):
-        raise ParseError(f"Unexpected empty value at pos {pos}")
+        raise ParseError("Unterminated composite", pos)
     char = arg[pos]
-    if char == "'" and not opts.aqf:
-        return _load_qstr(arg, pos + 1)
+    if char == ":" and not first_composite:
+        pos, count = _tape_dict(arg, pos + 1, opts, tape, depth)
+        tape._close(entry, _TAPE_DICT, count)
+        return pos
+    if char == "," or char == ")" or first_composite:
+        pos, count = _tape_list(arg, pos, opts, tape, depth)
+        tape._close(entry, _TAPE_LIST, count)
+        return pos
+    raise ParseError(f"Unexpected char {char} at pos {pos}, expected , or :", pos)
+
+
+def _tape_list(
+    arg: str, pos: int, opts: LoadOpts, tape: Tape, depth: int
+) -> Tuple[int, int]:
+    """Parse a list like `_load_list`, return the position and item count"""
+    count = 1
+    if opts.max_items is not None and count > opts.max_items:
+        _raise_max_items(pos, opts)
     while True:
         if pos == len(arg):
-            # We know string is not empty because we checked it before aposthrophe
-            assert len(ret)
-            return _convert_unquoted_atom(raw, ret, opts), pos
+            raise ParseError(f"Unterminated list", pos)
         char = arg[pos]
-        if char == "%":
-            enc, pos = _load_percent(arg, pos)
-            ret += enc
-            # no unquoted atom contains a percent
-            raw = None
-            continue
-        elif char == "+":
-            ret += " "
-            if raw is not None:
-                raw += "+"
-            pos += 1
-            continue
-        elif opts.aqf and char == "!":
-            ret += char
-            if raw is not None:
-                raw += char
-            pos += 1
-            if pos < len(arg):
-                char = arg[pos]
-                if char in "(),:!":
-                    ret += char
-                    if raw is not None:
-                        raw += char
-                    pos += 1
-        elif _is_unencoded(char) or char == "'":
-            ret += char
-            if raw is not None:
-                raw += char
-            pos += 1
-        else:
-            if len(ret) == 0:
-                raise ParseError(f"Unexpected empty value at pos {pos}")
-            return _convert_unquoted_atom(raw, ret, opts), pos
-
-
-def _load_list_data(arg: str, pos: int, opts: LoadOpts) -> list:
-    """Parse a list. pos points after the first item"""
-    ret: List[Any] = []
-    if pos == len(arg):
-        return ret
+        if char == ")":
+            return pos + 1, count
+        if char != ",":
+            raise ParseError(f"Unexpected char {char!r} at pos {pos} in list", pos)
+        pos = _tape_any(arg, pos + 1, opts, tape, depth)
+        count += 1
+        if opts.max_items is not None and count > opts.max_items:
+            _raise_max_items(pos, opts)
+
+
+def _tape_dict(
+    arg: str, pos: int, opts: LoadOpts, tape: Tape, depth: int
+) -> Tuple[int, int]:
+    """Parse a dict like `_load_dict`, return the position and item count"""
+    pos = _tape_any(arg, pos, opts, tape, depth)
+    count = 1
+    if opts.max_items is not None and count > opts.max_items:
+        _raise_max_items(pos, opts)
     while True:
-        item, pos = _load_any(arg, pos, opts)
-        ret.append(item)
         if pos == len(arg):
-            return ret
+            raise ParseError(f"Unterminated dict", pos)
         char = arg[pos]
+        if char == ")":
+            return pos + 1, count
         if char == ",":
             pos += 1
+        key, pos = _load_atom(arg, pos, opts)
+        tape._append_atom(key)
+        if pos == len(arg):
+            raise ParseError(f"Unterminated dict, missing value", pos)
+        char = arg[pos]
+        if char != ":":
+            raise ParseError(f"Unexpected char {char!r} at pos {pos}, expected :", pos)
+        pos = _tape_any(arg, pos + 1, opts, tape, depth)
+        count += 1
+        if opts.max_items is not None and count > opts.max_items:
+            _raise_max_items(pos, opts)
+
+
+def _tape_text(arg: str, opts: LoadOpts, tape: Tape):
+    """Parse text into the tape like `_load_text`"""
+    if not (opts.implied_dict or opts.implied_list):
+        pos = _tape_any(arg, 0, opts, tape, 0)
+        if pos != len(arg):
+            char = arg[pos]
+            raise ParseError(f"Expected end of input at {pos}, got {char!r}", pos)
+        return
+    entry = tape._open()
+    count = 0
+    pos = 0
+    while arg:
+        if count:
+            if pos == len(arg):
+                break
+            char = arg[pos]
+            if char != ",":
+                if not opts.implied_dict:
+                    raise ParseError(
+                        f"Unexpected char {char!r} at pos {pos} in list", pos
+                    )
+                raise ParseError(
+                    f"Unexpected char {char!r} at pos {pos}, expected , or end of input",
+                    pos,
+                )
+            pos += 1
+        if opts.implied_dict:
+            key, pos = _load_atom(arg, pos, opts)
+            tape._append_atom(key)
+            if pos == len(arg):
+                raise ParseError(f"Unterminated dict, missing value", pos)
+            char = arg[pos]
+            if char != ":":
+                raise ParseError(
+                    f"Unexpected char {char!r} at pos {pos}, expected :", pos
+                )
+            pos += 1
+        pos = _tape_any(arg, pos, opts, tape, 1)
+        count += 1
+        if opts.max_items is not None and count > opts.max_items:
+            _raise_max_items(pos, opts)
+    tape._close(entry, _TAPE_DICT if opts.implied_dict else _TAPE_LIST, count)
+
+
+def loads_tape(arg: str, opts: Optional[LoadOpts] = None, **kw) -> Tape:
+    """
+    Parse jsonurl text into a compact `Tape` instead of lists and dicts
+
+    Accepts the same text as `loads` and checks the same limits, except that
+    ``max_items`` counts duplicate dict keys. Use `Tape.value` to navigate
+    and `Tape.to_python` to build the regular result.
+    """
+    if opts is None:
+        opts = LoadOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    if opts.max_input_length is not None:
+        _check_max_input_length(arg, opts)
+    if opts.aqf:
+        arg = _partial_decode_aqf(arg)
+    tape = Tape()
+    _tape_text(arg, opts, tape)
+    tape._finish()
+    return tape
+
+
+# Parallel decoding splits implied data at top-level commas
+
+_search_comma_or_paren = _lazy_regex("_search_comma_or_paren", r"[(),]", "search")
+
+
+def _top_level_commas(arg: str, opts: LoadOpts, count: int) -> Optional[List[int]]:
+    """Top-level commas splitting arg into at most count similar chunks
+
+    Returns None if the scan finds unbalanced parens, the serial parser then
+    reports the exact error.
+    """
+    # without quotes or escapes depth can be counted in C, otherwise step
+    # through every structural character
+    exact = ("!" if opts.aqf else "'") not in arg
+    search = (
+        _search_comma_or_paren
+        if exact
+        else (_search_struct_aqf if opts.aqf else _search_struct)
+    )
+    ret: List[int] = []
+    depth = 0
+    pos = 0
+    atom_pos = 0
+    for index in range(1, count):
+        target = len(arg) * index // count
+        if target <= pos:
             continue
-        raise ParseError(f"Unexpected char {char!r} at pos {pos} in list")
+        if exact:
+            depth += arg.count("(", pos, target) - arg.count(")", pos, target)
+            pos = target
+        while True:
+            match = search(arg, pos)
+            if match is None:
+                return ret if depth == 0 else None
+            char = match.group()
+            pos = match.end()
+            if char == "!":
+                pos += 1
+                continue
+            if char == "'":
+                if match.start() == atom_pos:
+                    pos = arg.find("'", pos) + 1 or len(arg)
+                continue
+            atom_pos = pos
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth < 0:
+                    return None
+            elif char == "," and depth == 0 and pos > target:
+                ret.append(pos - 1)
+                break
+    return ret
 
 
-def _load_list(
-    arg: str, pos: int, first_element: Any, opts: LoadOpts
-) -> Tuple[list, int]:
-    """Parse a list. pos points after the first item"""
-    ret = [first_element]
+def _load_chunk(arg: str, opts: LoadOpts) -> Any:
+    if opts.implied_dict:
+        return _load_dict_data(arg, 0, opts)
+    return _load_list_data(arg, 0, opts)
+
+
+def loads_parallel(
+    arg: str,
+    opts: Optional[LoadOpts] = None,
+    *,
+    workers: Optional[int] = None,
+    executor: Optional["Executor"] = None,
+    min_chunk_length: int = 1 << 16,
+    **kw,
+) -> Any:
+    """
+    Parse a large implied list or dict in chunks on a process pool
+
+    The text is split at top-level commas into at most ``workers`` chunks of at
+    least ``min_chunk_length`` characters, defaulting to the number of CPUs.
+    Results are merged in order and equal those of `loads`, smaller or not
+    implied input is simply passed to `loads`. On any error the text is parsed
+    again serially so that the error matches `loads` exactly.
+
+    A new `concurrent.futures.ProcessPoolExecutor` is started for each call
+    unless an ``executor`` is passed, which is much cheaper for repeated calls.
+    Stats and slow hooks are not supported.
+    """
+    if opts is None:
+        opts = LoadOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    if not (opts.implied_list or opts.implied_dict):
+        return loads(arg, opts)
+    if opts.implied_list and opts.numpy_dtype is not None:
+        # Already parsed in bulk, chunks would need to be concatenated
+        return loads(arg, opts)
+    if opts.max_input_length is not None:
+        _check_max_input_length(arg, opts)
+    text = _partial_decode_aqf(arg) if opts.aqf else arg
+    if workers is None:
+        import os
+
+        workers = os.cpu_count() or 1
+    commas = _top_level_commas(text, opts, min(workers, len(text) // min_chunk_length))
+    if not commas:
+        return loads(arg, opts)
+    starts = [0] + [pos + 1 for pos in commas]
+    ends = commas + [len(text)]
+    chunks = [text[start:end] for start, end in zip(starts, ends)]
+    if not all(chunks):
+        return loads(arg, opts)
+    chunk_opts = replace(opts, slow_hook=None)
+    try:
+        if executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(len(chunks)) as pool:
+                results = list(
+                    pool.map(_load_chunk, chunks, [chunk_opts] * len(chunks))
+                )
+        else:
+            results = list(
+                executor.map(_load_chunk, chunks, [chunk_opts] * len(chunks))
+            )
+    except ParseError:
+        return loads(arg, opts)
+    if opts.implied_dict:
+        ret: Any = {}
+        for result in results:
+            ret.update(result)
+        if opts.frozen:
+            ret = FrozenDict(ret)
+    else:
+        ret = []
+        for result in results:
+            ret.extend(result)
+        if opts.frozen:
+            ret = tuple(ret)
+    if opts.max_items is not None and len(ret) > opts.max_items:
+        return loads(arg, opts)
+    return ret
+
+
+# Validation mirrors the _load_* functions but only returns positions.
+# Atoms are matched with the same regexes and only decoded in corner cases.
+
+
+def _skip_percent_runs(arg: str, pos: int, end: int):
+    """Check that percent-encoded runs in arg[pos:end] are valid UTF-8"""
+    for match in _finditer_percent_run(arg, pos, end):
+        _decode_percent_run(arg, match)
+
+
+def _skip_atom(arg: str, pos: int, opts: LoadOpts) -> int:
+    """Validate an atom like `_load_atom` and return the position after it"""
+    if pos == len(arg):
+        raise ParseError(f"Unexpected empty value at pos {pos}", pos)
+    if arg[pos] == "'" and not opts.aqf:
+        if opts.iri:
+            match = _match_skip_qstr_iri(arg, pos + 1)
+        else:
+            match = _match_skip_qstr(arg, pos + 1)
+        if match is None:
+            # let the real parser produce the exact error
+            return _load_qstr(arg, pos + 1, opts)[1]
+        end = match.end()
+        if "%" in match.group():
+            _skip_percent_runs(arg, pos, end)
+        if opts.max_string_length is not None and end - pos > opts.max_string_length:
+            # decoding never makes text longer, only check when it could matter
+            _load_qstr(arg, pos + 1, opts)
+        return end
+    if opts.iri:
+        match = (_match_skip_atom_aqf_iri if opts.aqf else _match_skip_atom_iri)(
+            arg, pos
+        )
+    elif opts.aqf:
+        match = _match_skip_atom_aqf(arg, pos)
+    else:
+        match = _match_skip_atom(arg, pos)
+    end = pos if match is None else match.end()
+    atom = arg[pos:end]
+    if "%" in atom:
+        _skip_percent_runs(arg, pos, end)
+    if end < len(arg) and arg[end] == "%":
+        # bad percent-encoding, raises
+        _load_percent(arg, end)
+    if end == pos:
+        raise ParseError(f"Unexpected empty value at pos {pos}", pos)
+    if opts.max_string_length is not None and end - pos > opts.max_string_length:
+        # decoding never makes text longer, only check when it could matter
+        _load_atom(arg, pos, opts)
+    if "%" in atom:
+        if opts.aqf and "!" in atom:
+            # escapes are checked after percent-decoding
+            _load_atom(arg, pos, opts)
+        return end
+    if opts.aqf and "!" in atom and atom != "!e":
+        epos = atom.find("!")
+        while epos != -1:
+            if epos == len(atom) - 1:
+                # same text as _unquote_aqf gets from _load_atom
+                text = atom.replace("+", " ")
+                raise ParseError(f"Invalid trailing ! in atom {text!r}")
+            # "+" in the text decodes to " " which is not a valid escape
+            char = atom[epos + 1]
+            if char not in "():,0123456789-!fnt":
+                char = " " if char == "+" else char
+                raise ParseError(f"Invalid !-escaped char {hex(ord(char))}")
+            epos = atom.find("!", epos + 2)
+    return end
+
+
+def _skip_list(arg: str, pos: int, opts: LoadOpts, depth: int) -> int:
+    """Validate a list like `_load_list`, pos points after the first item"""
+    count = 1
+    if opts.max_items is not None and count > opts.max_items:
+        _raise_max_items(pos, opts)
     while True:
         if pos == len(arg):
-            raise ParseError(f"Unterminated list")
+            raise ParseError(f"Unterminated list", pos)
         char = arg[pos]
         if char == ")":
-            return ret, pos + 1
+            return pos + 1
         if char == ",":
-            pos += 1
-            item, pos = _load_any(arg, pos, opts)
-            ret.append(item)
+            pos = _skip_any(arg, pos + 1, opts, depth)
+            count += 1
+            if opts.max_items is not None and count > opts.max_items:
+                _raise_max_items(pos, opts)
             continue
-        raise ParseError(f"Unexpected char {char!r} at pos {pos} in list")
+        raise ParseError(f"Unexpected char {char!r} at pos {pos} in list", pos)
 
 
-def _load_dict(arg: str, pos: int, first_key: Any, opts: LoadOpts) -> Tuple[dict, int]:
-    first_val, pos = _load_any(arg, pos, opts)
-    ret = {first_key: first_val}
+def _skip_dict(arg: str, pos: int, opts: LoadOpts, depth: int, start: int) -> int:
+    """Validate a dict like `_load_dict`, pos points after the first key
+
+    The start argument is the position of the opening paren.
+    """
+    pos = _skip_any(arg, pos, opts, depth)
+    count = 1
+    if opts.max_items is not None and count > opts.max_items:
+        _raise_max_items(pos, opts)
     while True:
         if pos == len(arg):
-            raise ParseError(f"Unterminated dict")
+            raise ParseError(f"Unterminated dict", pos)
         char = arg[pos]
         if char == ")":
-            return ret, pos + 1
+            return pos + 1
         if char == ",":
             pos += 1
-        key, pos = _load_atom(arg, pos, opts)
+        pos = _skip_atom(arg, pos, opts)
         if pos == len(arg):
-            raise ParseError(f"Unterminated dict, missing value")
+            raise ParseError(f"Unterminated dict, missing value", pos)
         char = arg[pos]
         if char != ":":
-            raise ParseError(f"Unexpected char {char!r} at pos {pos}, expected :")
-        pos += 1
-        val, pos = _load_any(arg, pos, opts)
-        ret[key] = val
+            raise ParseError(f"Unexpected char {char!r} at pos {pos}, expected :", pos)
+        pos = _skip_any(arg, pos + 1, opts, depth)
+        count += 1
+        if opts.max_items is not None and count > opts.max_items:
+            # duplicate keys are not counted by loads, decode keys to find out
+            return _load_any(arg, start, opts, depth - 1)[1]
 
 
-def _load_comp(arg: str, pos: int, opts: LoadOpts) -> Tuple[Any, int]:
-    """Parse a composite: list or dict"""
-    val, pos = _load_atom(arg, pos, opts)
+def _skip_any(arg: str, pos: int, opts: LoadOpts, depth: int) -> int:
+    """Validate any value like `_load_any` and return the position after it"""
+    if pos == len(arg):
+        raise ParseError(f"Unexpected end of input", pos)
+    if arg[pos] != "(":
+        return _skip_atom(arg, pos, opts)
+    depth += 1
+    if opts.max_depth is not None and depth > opts.max_depth:
+        _raise_max_depth(pos, opts)
+    start = pos
+    pos += 1
     if pos == len(arg):
-        raise ParseError("Unterminated composite")
+        raise ParseError("Unterminated composite, expected value", pos)
     char = arg[pos]
-    if char == ":":
+    if char == "(":
+        return _skip_list(arg, _skip_any(arg, pos, opts, depth), opts, depth)
+    if opts.distinguish_empty_list_dict and char == ":":
         pos += 1
-        return _load_dict(arg, pos, val, opts)
-    if char == ",":
-        return _load_list(arg, pos, val, opts)
+        if pos == len(arg) or arg[pos] != ")":
+            raise ParseError("Unterminated empty composite, expected )", pos)
+        return pos + 1
     if char == ")":
-        return _load_list(arg, pos, val, opts)
-    raise ParseError(f"Unexpected char {char} at pos {pos}, expected , or :")
+        return pos + 1
+    pos = _skip_atom(arg, pos, opts)
+    if pos == len(arg):
+        raise ParseError("Unterminated composite", pos)
+    char = arg[pos]
+    if char == ":":
+        return _skip_dict(arg, pos + 1, opts, depth, start)
+    if char == "," or char == ")":
+        return _skip_list(arg, pos, opts, depth)
+    raise ParseError(f"Unexpected char {char} at pos {pos}, expected , or :", pos)
 
 
-def _load_any(arg: str, pos: int, opts: LoadOpts) -> Tuple[Any, int]:
+def _skip_list_data(arg: str, pos: int, opts: LoadOpts) -> int:
+    """Validate implied list content like `_load_list_data`"""
     if pos == len(arg):
-        raise ParseError(f"Unexpected end of input")
-    if arg[pos] == "(":
-        pos += 1
+        return pos
+    count = 0
+    while True:
+        pos = _skip_any(arg, pos, opts, 1)
+        count += 1
+        if opts.max_items is not None and count > opts.max_items:
+            _raise_max_items(pos, opts)
         if pos == len(arg):
-            raise ParseError("Unterminated composite, expected value")
-        char = arg[pos]
-        if char == "(":
-            first_val, pos = _load_any(arg, pos, opts)
-            return _load_list(arg, pos, first_val, opts)
-        if opts.distinguish_empty_list_dict and char == ":":
-            pos += 1
-            if pos == len(arg):
-                raise ParseError("Unterminated empty composite, expected )")
-            char = arg[pos]
-            if char == ")":
-                return {}, pos + 1
-            else:
-                raise ParseError("Unterminated empty composite, expected )")
-        if char == ")":
-            if opts.distinguish_empty_list_dict:
-                return [], pos + 1
-            else:
-                return {}, pos + 1
-        return _load_comp(arg, pos, opts)
-    else:
-        return _load_atom(arg, pos, opts)
-
-
-def _load_top(arg: str, pos: int, opts: LoadOpts) -> Any:
-    ret, pos = _load_any(arg, pos, opts)
-    if pos != len(arg):
+            return pos
         char = arg[pos]
-        raise ParseError(f"Expected end of input at {pos}, got {char!r}")
-    return ret
+        if char != ",":
+            raise ParseError(f"Unexpected char {char!r} at pos {pos} in list", pos)
+        pos += 1
 
 
-def _load_dict_data(arg: str, pos: int, opts: LoadOpts) -> dict:
-    ret: Dict[str, Any] = {}
+def _skip_dict_data(arg: str, pos: int, opts: LoadOpts) -> int:
+    """Validate implied dict content like `_load_dict_data`"""
     if pos == len(arg):
-        return ret
+        return pos
+    start = pos
+    count = 0
     while True:
-        key, pos = _load_atom(arg, pos, opts)
+        pos = _skip_atom(arg, pos, opts)
         if pos == len(arg):
-            raise ParseError(f"Unterminated dict, missing value")
+            raise ParseError(f"Unterminated dict, missing value", pos)
         char = arg[pos]
         if char != ":":
-            raise ParseError(f"Unexpected char {char!r} at pos {pos}, expected :")
-        pos += 1
-        val, pos = _load_any(arg, pos, opts)
-        ret[key] = val
+            raise ParseError(f"Unexpected char {char!r} at pos {pos}, expected :", pos)
+        pos = _skip_any(arg, pos + 1, opts, 1)
+        count += 1
+        if opts.max_items is not None and count > opts.max_items:
+            # duplicate keys are not counted by loads, decode keys to find out
+            _load_dict_data(arg, start, opts)
+            return len(arg)
         if pos == len(arg):
-            return ret
+            return pos
         char = arg[pos]
         if char != ",":
             raise ParseError(
-                f"Unexpected char {char!r} at pos {pos}, expected , or end of input"
+                f"Unexpected char {char!r} at pos {pos}, expected , or end of input",
+                pos,
             )
         pos += 1
 
 
+def _skip_text(arg: str, opts: LoadOpts) -> None:
+    """Validate text, already partially decoded if AQF"""
+    if opts.implied_dict:
+        _skip_dict_data(arg, 0, opts)
+    elif opts.implied_list:
+        _skip_list_data(arg, 0, opts)
+    else:
+        pos = _skip_any(arg, 0, opts, 0)
+        if pos != len(arg):
+            char = arg[pos]
+            raise ParseError(f"Expected end of input at {pos}, got {char!r}", pos)
+
+
 @overload
-def loads(arg: str, opts: Optional[LoadOpts] = None) -> Any: ...
+def validate(arg: str, opts: Optional[LoadOpts] = None) -> None: ...
 
 
 @overload
-def loads(
+def validate(
     arg: str,
     *,
     implied_dict: bool = False,
     implied_list: bool = False,
     aqf: bool = False,
+    iri: bool = False,
     distinguish_empty_list_dict: bool = False,
-) -> Any: ...
+    max_input_length: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    max_items: Optional[int] = None,
+    max_string_length: Optional[int] = None,
+) -> None: ...
 
 
-def loads(arg: str, opts=None, **kw) -> Any:
+def validate(arg: str, opts=None, **kw) -> None:
     """
-    Convert a json object into a jsonurl string
+    Check that `loads` would accept a jsonurl string, without building values
 
-    Options can be passed as a `LoadOpts` object or as individual keyword arguments.
+    Raises `ParseError` for invalid text, same as `loads`.
     """
     if opts is None:
         opts = LoadOpts(**kw)
     elif kw:
         raise ValueError("Either opts or kw, not both")
+    if opts.max_input_length is not None:
+        _check_max_input_length(arg, opts)
 
     if opts.aqf:
         arg = _partial_decode_aqf(arg)
-    if opts.implied_dict:
-        return _load_dict_data(arg, 0, opts)
-    if opts.implied_list:
-        return _load_list_data(arg, 0, opts)
-    return _load_top(arg, 0, opts)
+    _skip_text(arg, opts)
+
+
+# Splicing scans with the validator to skip values which are not on the path
+
+
+def _find_child(
+    arg: str, pos: Optional[int], key: Any, opts: LoadOpts
+) -> Tuple[int, int, bool, int]:
+    """Locate key in the list or dict at pos, or in the implied one if pos is None
+
+    Returns the span of the value, whether the composite is a dict and the
+    position of its closing paren or end of input. The span is (-1, -1) if
+    the key is missing. Like `loads`, the last of duplicate dict keys wins so
+    dicts are always scanned to the end, lists stop at the index with a
+    closing position of -1.
+    """
+    implied = pos is None
+    if pos is None:
+        is_dict = opts.implied_dict
+        pos = 0
+        if not arg:
+            return -1, -1, is_dict, 0
+    else:
+        if pos == len(arg) or arg[pos] != "(":
+            raise TypeError(f"Value at pos {pos} is not a list or dict")
+        pos += 1
+        if pos == len(arg):
+            raise ParseError("Unterminated composite, expected value", pos)
+        char = arg[pos]
+        if char == ")":
+            return -1, -1, not opts.distinguish_empty_list_dict, pos
+        if opts.distinguish_empty_list_dict and char == ":":
+            if pos + 1 == len(arg) or arg[pos + 1] != ")":
+                raise ParseError("Unterminated empty composite, expected )", pos + 1)
+            return -1, -1, True, pos + 1
+        if char == "(":
+            is_dict = False
+        else:
+            end = _skip_atom(arg, pos, opts)
+            is_dict = end < len(arg) and arg[end] == ":"
+    if not is_dict and (not isinstance(key, int) or key < 0):
+        raise TypeError(f"List index must be a non-negative int, not {key!r}")
+    index = 0
+    found_start = found_end = -1
+    while True:
+        if is_dict:
+            item_key, end = _load_atom(arg, pos, opts)
+            if end == len(arg):
+                raise ParseError(f"Unterminated dict, missing value", end)
+            if arg[end] != ":":
+                char = arg[end]
+                raise ParseError(
+                    f"Unexpected char {char!r} at pos {end}, expected :", end
+                )
+            start = end + 1
+            found = item_key == key
+        else:
+            start = pos
+            found = index == key
+            index += 1
+        end = _skip_any(arg, start, opts, 0)
+        if found:
+            if not is_dict:
+                return start, end, is_dict, -1
+            found_start, found_end = start, end
+        if end == len(arg):
+            if implied:
+                return found_start, found_end, is_dict, end
+            raise ParseError(f"Unterminated {'dict' if is_dict else 'list'}", end)
+        char = arg[end]
+        if char == ")" and not implied:
+            return found_start, found_end, is_dict, end
+        if char != ",":
+            raise ParseError(f"Unexpected char {char!r} at pos {end}", end)
+        pos = end + 1
+
+
+def _sorted_insert_pos(
+    arg: str, pos: Optional[int], key: str, opts: LoadOpts, dopts: DumpOpts
+) -> int:
+    """Position of the first item in a dict found by `_find_child` that sorts
+    after the encoded key like `DumpOpts.sort_keys`, or -1 if there is none
+    """
+    pos = 0 if pos is None else pos + 1
+    while True:
+        item_key, end = _load_atom(arg, pos, opts)
+        if _dump_any(item_key, dopts) > key:
+            return pos
+        end = _skip_any(arg, end + 1, opts, 0)
+        if end == len(arg) or arg[end] == ")":
+            return -1
+        pos = end + 1
+
+
+@overload
+def replace_at(
+    arg: str, path: Sequence, value: Any, opts: Optional[DumpOpts] = None
+) -> str: ...
+
+
+@overload
+def replace_at(
+    arg: str,
+    path: Sequence,
+    value: Any,
+    *,
+    implied_list: bool = False,
+    implied_dict: bool = False,
+    aqf: bool = False,
+    iri: bool = False,
+    safe: str = "",
+    minimize: bool = False,
+    distinguish_empty_list_dict: bool = False,
+    sort_keys: bool = False,
+) -> str: ...
+
+
+def replace_at(arg: str, path: Sequence, value: Any, opts=None, **kw) -> str:
+    """
+    Replace the value at path in jsonurl text and return the new text
+
+    The path is a sequence of dict keys and list indexes, like subscripts of the
+    `loads` result. Only the text up to the target, or the end of dicts on
+    the path, is scanned and only the new value is encoded with `dumps`
+    options. If the last key is missing from a dict it is added at the end,
+    or with ``sort_keys`` before the first key that sorts after it so sorted
+    dicts stay sorted.
+
+    If a dict key appears more than once the last occurrence is replaced,
+    which is the one `loads` keeps.
+    In AQF mode percent-encoded structural characters are decoded in the
+    result, which does not change its meaning.
+    """
+    if opts is None:
+        opts = DumpOpts(**kw)
+    elif kw:
+        raise ValueError("Either opts or kw, not both")
+    check_can_mark_safe(opts.safe, opts.aqf)
+    load_opts = LoadOpts(
+        implied_list=opts.implied_list,
+        implied_dict=opts.implied_dict,
+        distinguish_empty_list_dict=opts.distinguish_empty_list_dict,
+        aqf=opts.aqf,
+        iri=opts.iri,
+    )
+    if opts.aqf:
+        arg = _partial_decode_aqf(arg)
+    if not path:
+        return _dump_top(value, opts)
+    pos: Optional[int] = None if opts.implied_list or opts.implied_dict else 0
+    start = end = 0
+    for i, key in enumerate(path):
+        start, end, is_dict, close = _find_child(arg, pos, key, load_opts)
+        if start < 0:
+            if not is_dict:
+                raise IndexError(f"List index {key} out of range")
+            if i != len(path) - 1:
+                raise KeyError(key)
+            key_text = _dump_key(key, opts)
+            item = key_text + ":" + _dump_any(value, opts)
+            if pos is None and close == 0 or pos == close - 1:
+                return arg[:close] + item + arg[close:]
+            if pos == close - 2 and arg[close - 1] == ":":
+                # distinguished empty dict
+                return arg[: close - 1] + item + arg[close:]
+            if opts.sort_keys:
+                insert = _sorted_insert_pos(arg, pos, key_text, load_opts, opts)
+                if insert >= 0:
+                    return arg[:insert] + item + "," + arg[insert:]
+            return arg[:close] + "," + item + arg[close:]
+        pos = start
+    return arg[:start] + _dump_any(value, opts) + arg[end:]
 
 
 def _add_common_args(parser):
@@ -575,12 +3403,20 @@ def _add_common_args(parser):
         action="store_true",
         help="Address Bar Query String Friendly mode",
     )
+    parser.add_argument(
+        "-i",
+        "--iri",
+        action="store_true",
+        help="Leave non-ASCII characters unencoded",
+    )
 
 
 def create_parser():
     from argparse import ArgumentParser
 
-    parser = ArgumentParser(description=__doc__, prog="jsonurl-py")
+    # Read at runtime, mypyc-compiled modules have no docstring
+    description = globals().get("__doc__")
+    parser = ArgumentParser(description=description, prog="jsonurl-py")
     subtop = parser.add_subparsers(dest="subcmd", metavar="SUBCMD", required=True)
 
     sub = subtop.add_parser("load", help="Parse JSONURL input and output JSON")
@@ -593,11 +3429,58 @@ def create_parser():
     return parser
 
 
+_FAST_ARGS = {
+    "-l": "implied_list",
+    "--implied-list": "implied_list",
+    "-d": "implied_dict",
+    "--implied-dict": "implied_dict",
+    "-a": "aqf",
+    "--address-query-friendly": "aqf",
+    "-i": "iri",
+    "--iri": "iri",
+}
+
+
+def _parse_args_fast(argv: List[str]):
+    """Parse simple command lines without the startup cost of argparse
+
+    Returns None for anything else, argparse then handles it including help and
+    error messages.
+    """
+    from types import SimpleNamespace
+
+    if not argv or argv[0] not in ("load", "dump"):
+        return None
+    ret = SimpleNamespace(
+        subcmd=argv[0], implied_list=False, implied_dict=False, aqf=False, iri=False
+    )
+    if ret.subcmd == "load":
+        ret.indent = None
+    pos = 1
+    while pos < len(argv):
+        arg = argv[pos]
+        if arg in _FAST_ARGS:
+            setattr(ret, _FAST_ARGS[arg], True)
+        elif ret.subcmd != "load":
+            return None
+        elif arg.startswith("--indent=") and arg[9:].isdigit():
+            ret.indent = int(arg[9:])
+        elif arg == "--indent" and pos + 1 < len(argv) and argv[pos + 1].isdigit():
+            pos += 1
+            ret.indent = int(argv[pos])
+        else:
+            return None
+        pos += 1
+    return ret
+
+
 def main(argv=None):
     import json
 
-    common_keys = ["implied_list", "implied_dict", "aqf"]
-    opts = create_parser().parse_args(argv)
+    if argv is None:
+        argv = sys.argv[1:]
+    common_keys = ["implied_list", "implied_dict", "aqf", "iri"]
+    opts = _parse_args_fast(argv) or create_parser().parse_args(argv)
     if opts.subcmd == "load":
         load_opts = LoadOpts(**{k: getattr(opts, k) for k in common_keys})
         input = sys.stdin.read().rstrip("\n")
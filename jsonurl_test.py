@@ -1,5 +1,9 @@
+import inspect
 import json
+import pickle
 import string
+import sys
+from typing import Any, Dict, List
 
 import pytest
 
@@ -424,6 +428,22 @@ def test_unterminated_percent_message():
         jsonurl.loads("a%a", aqf=True)
 
 
+def test_percent_error_messages():
+    with pytest.raises(jsonurl.ParseError, match="Invalid UTF-8") as e:
+        jsonurl.loads("(a%C3%A9b+%C3c)")
+    assert e.value.pos == 10
+    with pytest.raises(jsonurl.ParseError, match="Invalid hex digit") as e:
+        jsonurl.loads("'a%C3%zz'")
+    assert e.value.pos == 6
+    assert jsonurl.loads("'a+%C3%A9:b'") == "a \u00e9:b"
+
+
+def test_loads_long_atom():
+    data = ["a b,\u00e9!" * 10000, "x" * 100000]
+    for aqf in [False, True]:
+        assert jsonurl.loads(jsonurl.dumps(data, aqf=aqf), aqf=aqf) == data
+
+
 def test_invalid_bang_escape_message():
     with pytest.raises(jsonurl.ParseError, match="Invalid !-escaped char 0x61"):
         jsonurl.loads("!a", aqf=True)
@@ -547,3 +567,746 @@ def test_distinguish_empty_complex():
         distinguish_empty_list_dict=True,
         implied_dict=True,
     )
+
+
+def test_stats_loads():
+    stats = jsonurl.Stats()
+    assert jsonurl.loads("(a:(1,'x,y'),b:%C3%A9)", stats=stats) == dict(
+        a=[1, "x,y"], b="é"
+    )
+    assert stats.calls == 1
+    assert stats.atoms == 5
+    assert stats.composites == 2
+    assert stats.max_depth == 2
+    assert stats.percent_bytes == 2
+    assert stats.input_length == 22
+    assert set(stats.phase_times) == {"parse"}
+
+
+def test_stats_loads_aqf():
+    stats = jsonurl.Stats()
+    assert jsonurl.loads("a:!(x!,,b:%28!1)", aqf=True, implied_dict=True, stats=stats)
+    assert stats.atoms == 4
+    assert stats.composites == 2
+    assert stats.aqf_escapes == 3
+    assert stats.percent_bytes == 1
+    assert set(stats.phase_times) == {"aqf_decode", "parse"}
+
+
+def test_stats_dumps_accumulate():
+    stats = jsonurl.Stats()
+    assert jsonurl.dumps(dict(a=["x,y", "é"]), aqf=True, stats=stats) == (
+        "(a:(x!,y,%C3%A9))"
+    )
+    assert jsonurl.dumps([[[1]]], stats=stats) == "(((1)))"
+    assert stats.calls == 2
+    assert stats.atoms == 4
+    assert stats.composites == 5
+    assert stats.max_depth == 3
+    assert stats.aqf_escapes == 1
+    assert stats.percent_bytes == 2
+    assert stats.output_length == 24
+    assert set(stats.phase_times) == {"encode"}
+
+
+def test_slow_hook_opts():
+    calls: List[jsonurl.SlowCall] = []
+    hook = jsonurl.SlowHook(callback=calls.append, min_length=5, max_text_length=4)
+    assert jsonurl.loads("(a)", slow_hook=hook) == ["a"]
+    assert calls == []
+    assert jsonurl.loads("(a:!(,b:c)", aqf=True, slow_hook=hook) == dict(a="(", b="c")
+    [call] = calls
+    assert call.func == "loads"
+    assert call.text == "(a:!" and call.truncated
+    assert call.stats.atoms == 4 and call.stats.aqf_escapes == 1
+    assert call.error is None
+    assert call.replay_record()["opts"]["aqf"] is True
+    json.dumps(call.replay_record())
+
+
+def test_slow_hook_global():
+    calls: List[jsonurl.SlowCall] = []
+    prev = jsonurl.set_slow_hook(jsonurl.SlowHook(callback=calls.append))
+    try:
+        assert jsonurl.dumps(dict(a=1)) == "(a:1)"
+        assert_load_fail("(a")
+    finally:
+        assert jsonurl.set_slow_hook(prev) is not None
+    assert [call.func for call in calls] == ["dumps", "loads"]
+    assert calls[0].text == "(a:1)" and calls[0].stats.output_length == 5
+    assert isinstance(calls[1].error, jsonurl.ParseError)
+    assert jsonurl.loads("(a:1)") == dict(a=1)
+    assert len(calls) == 2
+
+
+def test_slow_hook_duration():
+    calls: List[jsonurl.SlowCall] = []
+    hook = jsonurl.SlowHook(callback=calls.append, min_duration=3600)
+    assert jsonurl.dumps([1, 2], jsonurl.DumpOpts(slow_hook=hook)) == "(1,2)"
+    assert calls == []
+    hook.min_duration = 0
+    assert jsonurl.dumps([1, 2], jsonurl.DumpOpts(slow_hook=hook)) == "(1,2)"
+    assert len(calls) == 1 and calls[0].duration >= 0
+
+
+def test_parse_error_pos():
+    with pytest.raises(jsonurl.ParseError) as e:
+        jsonurl.loads("(a,b c)")
+    assert e.value.pos == 4
+    with pytest.raises(jsonurl.ParseError) as e:
+        jsonurl.loads("(a,%FF)")
+    assert e.value.pos == 3
+
+
+@pytest.mark.parametrize("arg", ERROR_STRINGS)
+def test_validate_errors(arg: str):
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.validate(arg)
+
+
+@pytest.mark.parametrize("arg_out", PARSE_DATA)
+def test_validate_data(arg_out):
+    assert jsonurl.validate(arg_out[0]) is None
+
+
+def test_validate_aqf():
+    jsonurl.validate("(a:!(,b:!e,c:!true,d:1e!-3)", aqf=True)
+    jsonurl.validate("(a:!%28,b:%21%66)", aqf=True)
+    for text in ["a!", "a!x", "a!+", "a!%78", "!e!"]:
+        with pytest.raises(jsonurl.ParseError):
+            jsonurl.validate(text, aqf=True)
+
+
+def test_validate_distinguish():
+    jsonurl.validate("a:(:),b:()", implied_dict=True, distinguish_empty_list_dict=True)
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.validate("a:(:)", implied_dict=True)
+
+
+def test_validate_fuzz():
+    """validate accepts exactly what loads accepts, with the same error"""
+    import random
+
+    rnd = random.Random(0)
+    pieces = ["(", ")", ",", ":", "'", "!", "a", "1", "e", "true", "%", "%2"]
+    pieces += ["%28", "%2C", "%3A", "%21", "%C3%A9", "%C3", "%FF", "+", "&", "!e"]
+    for _ in range(5000):
+        text = "".join(rnd.choice(pieces) for _ in range(rnd.randint(0, 8)))
+        opts = jsonurl.LoadOpts(
+            aqf=rnd.random() < 0.5,
+            distinguish_empty_list_dict=rnd.random() < 0.3,
+            implied_list=rnd.random() < 0.3,
+        )
+        try:
+            jsonurl.loads(text, opts)
+            expected = None
+        except jsonurl.ParseError as e:
+            expected = (str(e), e.pos)
+        try:
+            jsonurl.validate(text, opts)
+            assert expected is None, text
+        except jsonurl.ParseError as e:
+            assert (str(e), e.pos) == expected, text
+
+
+def test_max_input_length():
+    assert jsonurl.loads("(a,b)", max_input_length=5) == ["a", "b"]
+    with pytest.raises(jsonurl.ParseError, match="max_input_length") as e:
+        jsonurl.loads("(a,bc)", max_input_length=5)
+    assert e.value.pos == 5
+    with pytest.raises(jsonurl.ParseError, match="max_input_length"):
+        jsonurl.validate("(a,bc)", max_input_length=5)
+
+
+def test_max_depth():
+    assert jsonurl.loads("((a))", max_depth=2) == [["a"]]
+    with pytest.raises(jsonurl.ParseError, match="max_depth") as e:
+        jsonurl.loads("(((a)))", max_depth=2)
+    assert e.value.pos == 2
+    assert jsonurl.loads("a:(b)", implied_dict=True, max_depth=2) == {"a": ["b"]}
+    with pytest.raises(jsonurl.ParseError, match="max_depth"):
+        jsonurl.loads("a:(b)", implied_dict=True, max_depth=1)
+    with pytest.raises(jsonurl.ParseError, match="max_depth"):
+        jsonurl.validate("(((a)))", max_depth=2)
+
+
+def test_max_items():
+    assert jsonurl.loads("(a,b,c)", max_items=3) == ["a", "b", "c"]
+    with pytest.raises(jsonurl.ParseError, match="max_items") as e:
+        jsonurl.loads("(a,b,c,d,e)", max_items=3)
+    assert e.value.pos == 8
+    with pytest.raises(jsonurl.ParseError, match="max_items"):
+        jsonurl.loads("a:1,b:2", implied_dict=True, max_items=1)
+    # duplicate keys only count once
+    assert jsonurl.loads("(a:1,a:2)", max_items=1) == {"a": 2}
+    assert jsonurl.validate("(a:1,a:2)", max_items=1) is None
+    with pytest.raises(jsonurl.ParseError, match="max_items"):
+        jsonurl.validate("(a,b,c,d)", max_items=3)
+
+
+def test_max_string_length():
+    assert jsonurl.loads("(%C3%A9t%C3%A9)", max_string_length=3) == ["été"]
+    with pytest.raises(jsonurl.ParseError, match="max_string_length") as e:
+        jsonurl.loads("(a,abcd)", max_string_length=3)
+    assert e.value.pos == 3
+    with pytest.raises(jsonurl.ParseError, match="max_string_length"):
+        jsonurl.loads("('abcd')", max_string_length=3)
+    with pytest.raises(jsonurl.ParseError, match="max_string_length"):
+        jsonurl.loads("(abcd:1)", max_string_length=3)
+    with pytest.raises(jsonurl.ParseError, match="max_string_length"):
+        jsonurl.validate("(a,abcd)", max_string_length=3)
+
+
+def test_freeze():
+    data = {"a": [1, {"b": [2]}], "c": "d"}
+    frozen = jsonurl.freeze(data)
+    assert frozen == {"a": (1, {"b": (2,)}), "c": "d"}
+    assert isinstance(frozen, jsonurl.FrozenDict)
+    assert hash(frozen) == hash(jsonurl.freeze(data))
+    with pytest.raises(TypeError):
+        frozen["c"] = "e"
+    with pytest.raises(TypeError):
+        frozen.update(c="e")
+    assert jsonurl.dumps(frozen) == jsonurl.dumps(data)
+    assert pickle.loads(pickle.dumps(frozen)) == frozen
+
+
+def test_loads_cache():
+    cache = jsonurl.LoadsCache(maxsize=2)
+    val = cache.loads("(a:(1,2))")
+    assert val == {"a": (1, 2)}
+    assert cache.loads("(a:(1,2))") is val
+    assert cache.loads("(a:(1,2))", implied_list=True) == ({"a": (1, 2)},)
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 0)
+    # LRU: "(a:(1,2))" was used more recently than the implied_list variant
+    cache.loads("(a:(1,2))")
+    cache.loads("b")
+    assert (cache.hits, cache.misses, cache.evictions) == (2, 3, 1)
+    assert cache.loads("(a:(1,2))") is val
+    assert len(cache) == 2
+    assert cache.hit_rate == 0.5
+    with pytest.raises(jsonurl.ParseError):
+        cache.loads("(a")
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_loads_cache_slow_hook():
+    calls: List[jsonurl.SlowCall] = []
+    hook = jsonurl.SlowHook(callback=calls.append)
+    cache = jsonurl.LoadsCache()
+    assert cache.loads("(a:1)", slow_hook=hook) == {"a": 1}
+    # the hook does not change the result so it is not part of the key
+    assert cache.loads("(a:1)", slow_hook=None) == {"a": 1}
+    assert (cache.hits, cache.misses, len(calls)) == (1, 1, 1)
+
+
+def test_loads_cache_frozen():
+    cache = jsonurl.LoadsCache()
+    val = cache.loads("(a:1)")
+    # results are frozen either way so frozen is not part of the key
+    assert cache.loads("(a:1)", frozen=True) is val
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_loads_cache_copy():
+    cache = jsonurl.LoadsCache(copy=True)
+    val = cache.loads("(a:(1,2))")
+    val["a"].append(3)
+    assert cache.loads("(a:(1,2))") == {"a": [1, 2]}
+
+
+@pytest.mark.parametrize("arg_out", PARSE_DATA)
+def test_load_frozen(arg_out):
+    arg, out = arg_out
+    assert jsonurl.loads(arg, frozen=True) == jsonurl.freeze(out)
+
+
+def test_load_frozen_types():
+    val = jsonurl.loads("(a:(1,()),b:(c:d))", frozen=True)
+    assert type(val) is jsonurl.FrozenDict
+    assert type(val["a"]) is tuple and type(val["a"][1]) is jsonurl.FrozenDict
+    assert hash(val) == hash(jsonurl.freeze(jsonurl.loads("(a:(1,()),b:(c:d))")))
+    opts = jsonurl.LoadOpts(frozen=True, distinguish_empty_list_dict=True)
+    assert jsonurl.loads("((),(:))", opts) == ((), {})
+    assert type(jsonurl.loads("a,b", implied_list=True, frozen=True)) is tuple
+    val = jsonurl.loads("a:b", implied_dict=True, frozen=True)
+    assert type(val) is jsonurl.FrozenDict
+
+
+@pytest.mark.parametrize("arg_out", PARSE_DATA)
+def test_loads_lazy(arg_out):
+    arg, out = arg_out
+    val = jsonurl.loads_lazy(arg)
+    assert val == out
+    if isinstance(out, (list, dict)):
+        assert val.to_python() == out
+
+
+def test_loads_lazy_access():
+    val = jsonurl.loads_lazy("(a:(b:(1,'x,y'),c:%C3%A9),d:(3,4,5))")
+    assert isinstance(val, jsonurl.LazyDict)
+    assert list(val) == ["a", "d"]
+    assert isinstance(val["d"], jsonurl.LazyList)
+    assert val["d"][-1] == 5
+    assert val["d"][:2] == [3, 4]
+    assert val["a"]["b"][1] == "x,y"
+    assert val["a"] is val["a"]
+    assert val.get("z") is None
+    text = "a:(1,2),b:!(x!),c:()"
+    val = jsonurl.loads_lazy(text, aqf=True, implied_dict=True)
+    assert val == jsonurl.loads(text, aqf=True, implied_dict=True)
+    assert jsonurl.loads_lazy("a,b", implied_list=True)[1] == "b"
+    assert jsonurl.loads_lazy("", implied_list=True) == []
+    opts = jsonurl.LoadOpts(distinguish_empty_list_dict=True)
+    assert jsonurl.loads_lazy("((),(:))", opts) == [[], {}]
+
+
+def test_loads_lazy_errors():
+    for text in ["(a", "a)", "(a)b", "", "a,b"]:
+        with pytest.raises(jsonurl.ParseError):
+            jsonurl.loads_lazy(text)
+    # only the parts which are read are decoded
+    val = jsonurl.loads_lazy("(a:1,b:%FF,c:(x:y:z))")
+    assert val["a"] == 1
+    with pytest.raises(jsonurl.ParseError):
+        val["b"]
+    with pytest.raises(jsonurl.ParseError):
+        val["c"]
+    with pytest.raises(jsonurl.ParseError):
+        val.to_python()
+
+
+@pytest.mark.parametrize("arg_out", PARSE_DATA)
+def test_loads_tape(arg_out):
+    arg, out = arg_out
+    assert jsonurl.loads_tape(arg).to_python() == out
+
+
+def test_loads_tape_navigation():
+    tape = jsonurl.loads_tape(
+        "(a:(1,2.5,'x'),b:(c:null),a:(true,99999999999999999999))"
+    )
+    root = tape.value()
+    assert isinstance(root, jsonurl.TapeView) and root.is_dict
+    assert list(root) == ["a", "b", "a"]
+    assert len(root) == 3
+    assert root["a"].to_python() == [True, 99999999999999999999]
+    assert root["b"]["c"] is None
+    assert dict(root.items())["b"].to_python() == {"c": None}
+    with pytest.raises(KeyError):
+        root["z"]
+    tape = jsonurl.loads_tape("(1,2.5,'x')")
+    root = tape.value()
+    assert list(root) == [1, 2.5, "x"]
+    assert root[-1] == "x"
+    with pytest.raises(IndexError):
+        root[3]
+    assert tape.pool == "x"
+    tape = jsonurl.loads_tape("a:1,b:!(", implied_dict=True, aqf=True)
+    assert tape.to_python() == {"a": 1, "b": "("}
+    assert jsonurl.loads_tape("a", implied_list=True).value()[0] == "a"
+
+
+@pytest.mark.parametrize("arg", ERROR_STRINGS)
+def test_loads_tape_errors(arg: str):
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.loads_tape(arg)
+
+
+@pytest.mark.parametrize(
+    "arg, kw",
+    [
+        ("a)", {"implied_list": True}),
+        ("a,b:1", {"implied_list": True}),
+        ("a:1)", {"implied_dict": True}),
+        ("a:1,b", {"implied_dict": True}),
+    ],
+)
+def test_loads_tape_implied_errors(arg: str, kw):
+    with pytest.raises(jsonurl.ParseError) as expected:
+        jsonurl.loads(arg, **kw)
+    with pytest.raises(jsonurl.ParseError) as e:
+        jsonurl.loads_tape(arg, **kw)
+    assert (str(e.value), e.value.pos) == (str(expected.value), expected.value.pos)
+
+
+def test_dumps_sort_keys():
+    data = {"b": 1, "a": {"d": 2, "c": 3}, 1: "x"}
+    assert jsonurl.dumps(data, sort_keys=True) == "(1:x,a:(c:3,d:2),b:1)"
+
+
+def test_canonicalize():
+    assert jsonurl.canonicalize("(b:'true',a:%c3%a9,c:(2,1e1))") == (
+        "(a:%C3%A9,b:'true',c:(2,10.0))"
+    )
+    assert jsonurl.canonicalize("b:!true,a:x!,y", aqf=True, implied_dict=True) == (
+        "a:x!,y,b:!true"
+    )
+    assert jsonurl.canonicalize("(a:1,a:2)") == "(a:2)"
+    assert jsonurl.canonicalize("x,'y'", implied_list=True) == "x,y"
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.canonicalize("(a:1")
+
+
+@pytest.mark.parametrize("arg_out", PARSE_DATA)
+def test_canonicalize_dumps(arg_out):
+    arg = arg_out[0]
+    expected = jsonurl.dumps(jsonurl.loads(arg), sort_keys=True)
+    assert jsonurl.canonicalize(arg) == expected
+
+
+@pytest.mark.parametrize("arg", ERROR_STRINGS)
+def test_canonicalize_errors(arg: str):
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.canonicalize(arg)
+
+
+def test_replace_at():
+    text = "(filter:(status:open,tags:(a,b)),page:1)"
+    assert (
+        jsonurl.replace_at(text, ["page"], 2)
+        == "(filter:(status:open,tags:(a,b)),page:2)"
+    )
+    assert jsonurl.replace_at(text, ["filter", "tags", 1], "c d") == (
+        "(filter:(status:open,tags:(a,c+d)),page:1)"
+    )
+    assert jsonurl.replace_at(text, ["filter", "owner"], "me") == (
+        "(filter:(status:open,tags:(a,b),owner:me),page:1)"
+    )
+    assert jsonurl.replace_at(text, [], [1]) == "(1)"
+    assert jsonurl.replace_at("a:1,b:2", ["b"], "true", implied_dict=True) == (
+        "a:1,b:'true'"
+    )
+    assert jsonurl.replace_at("a:1", ["b"], "true", implied_dict=True, aqf=True) == (
+        "a:1,b:!true"
+    )
+    assert jsonurl.replace_at("", ["a"], 1, implied_dict=True) == "a:1"
+    assert jsonurl.replace_at("x,y", [0], "z", implied_list=True) == "z,y"
+    assert jsonurl.replace_at("(a:())", ["a", "b"], 1) == "(a:(b:1))"
+    opts = jsonurl.DumpOpts(distinguish_empty_list_dict=True)
+    assert jsonurl.replace_at("(a:(:))", ["a", "b"], 1, opts) == "(a:(b:1))"
+
+
+def test_replace_at_duplicate_keys():
+    text = "(a:1,b:(c:1,c:2),a:2)"
+    assert jsonurl.replace_at(text, ["a"], 5) == "(a:1,b:(c:1,c:2),a:5)"
+    assert jsonurl.replace_at(text, ["b", "c"], 5) == "(a:1,b:(c:1,c:5),a:2)"
+    assert jsonurl.replace_at("a:1,a:2", ["a"], 5, implied_dict=True) == "a:1,a:5"
+    # the edit is visible to loads, which keeps the last duplicate
+    assert jsonurl.loads(jsonurl.replace_at(text, ["a"], 5))["a"] == 5
+
+
+def test_replace_at_sort_keys():
+    text = "(b:1,d:(x:1,z:2))"
+    assert jsonurl.replace_at(text, ["a"], 0, sort_keys=True) == "(a:0,b:1,d:(x:1,z:2))"
+    assert jsonurl.replace_at(text, ["c"], 0, sort_keys=True) == "(b:1,c:0,d:(x:1,z:2))"
+    assert jsonurl.replace_at(text, ["e"], 0, sort_keys=True) == "(b:1,d:(x:1,z:2),e:0)"
+    assert jsonurl.replace_at(text, ["d", "y"], 0, sort_keys=True) == (
+        "(b:1,d:(x:1,y:0,z:2))"
+    )
+    # keys are compared encoded like dumps does, ' sorts before digits
+    text2 = "1:x,b:y"
+    assert jsonurl.replace_at(text2, ["1"], 0, sort_keys=True, implied_dict=True) == (
+        "'1':0,1:x,b:y"
+    )
+    for key in ["a", "c", "e", "b"]:
+        data = jsonurl.loads(text)
+        data[key] = 0
+        assert jsonurl.replace_at(text, [key], 0, sort_keys=True) == (
+            jsonurl.dumps(data, sort_keys=True)
+        )
+
+
+def test_replace_at_errors():
+    with pytest.raises(IndexError):
+        jsonurl.replace_at("(a,b)", [2], 1)
+    with pytest.raises(TypeError):
+        jsonurl.replace_at("(a,b)", ["x"], 1)
+    with pytest.raises(TypeError):
+        jsonurl.replace_at("(a:b)", ["a", "c"], 1)
+    with pytest.raises(KeyError):
+        jsonurl.replace_at("(a:b)", ["x", "c"], 1)
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.replace_at("(a:(b,c)", ["z"], 1)
+
+
+def test_encoded_length():
+    data = {"a": [1, "x y", "true", "", 2.5], "é": {}, "b": ("c",)}
+    for opts in [
+        jsonurl.DumpOpts(),
+        jsonurl.DumpOpts(aqf=True),
+        jsonurl.DumpOpts(distinguish_empty_list_dict=True),
+    ]:
+        assert jsonurl.encoded_length(data, opts) == len(jsonurl.dumps(data, opts))
+    assert jsonurl.encoded_length([1, 2], implied_list=True) == 3
+    assert jsonurl.encoded_length({}, implied_dict=True) == 0
+
+
+def test_dumps_max_length():
+    data = {"a": [1, 2, 3], "b": "c"}
+    text = jsonurl.dumps(data)
+    assert jsonurl.dumps(data, max_length=len(text)) == text
+    with pytest.raises(jsonurl.MaxLengthError):
+        jsonurl.dumps(data, max_length=len(text) - 1)
+    with pytest.raises(ValueError):
+        jsonurl.dumps(list(range(100)), max_length=5, implied_list=True)
+
+
+def test_dumps_max_length_early():
+    """Encoding stops before reaching the unsupported item"""
+    with pytest.raises(jsonurl.MaxLengthError):
+        jsonurl.dumps(["a", "b", object()], max_length=4)
+    with pytest.raises(TypeError):
+        jsonurl.dumps(["a", "b", object()], max_length=40)
+
+
+def test_loads_parallel():
+    from concurrent.futures import ThreadPoolExecutor
+
+    data = [{"a": i, "b": ["x,y", "(z)"]} for i in range(50)]
+    with ThreadPoolExecutor(4) as executor:
+        for aqf in [False, True]:
+            opts = jsonurl.LoadOpts(implied_list=True, aqf=aqf)
+            text = jsonurl.dumps(data, implied_list=True, aqf=aqf)
+            result = jsonurl.loads_parallel(
+                text, opts, executor=executor, workers=4, min_chunk_length=10
+            )
+            assert result == data
+        text = "a:1,b:(2,3),a:4"
+        result = jsonurl.loads_parallel(
+            text, implied_dict=True, executor=executor, min_chunk_length=1
+        )
+        assert result == {"a": 4, "b": [2, 3]}
+        for text in ["a,(b,c,d", "a,b),c,d", "a,b,,c", "a,b,c,", "a,b,c:d"]:
+            with pytest.raises(jsonurl.ParseError) as e:
+                jsonurl.loads(text, implied_list=True)
+            with pytest.raises(jsonurl.ParseError) as e2:
+                jsonurl.loads_parallel(
+                    text, implied_list=True, executor=executor, min_chunk_length=1
+                )
+            assert (str(e2.value), e2.value.pos) == (str(e.value), e.value.pos)
+
+
+def test_loads_parallel_process_pool():
+    text = jsonurl.dumps(list(range(1000)), implied_list=True)
+    assert jsonurl.loads_parallel(
+        text, implied_list=True, workers=2, min_chunk_length=100
+    ) == list(range(1000))
+    assert jsonurl.loads_parallel("(1,2)") == [1, 2]
+
+
+def test_dump_iterables():
+    from array import array
+    from collections import OrderedDict
+    from types import MappingProxyType
+
+    assert jsonurl.dumps(range(3)) == "(0,1,2)"
+    assert jsonurl.dumps(x * 2 for x in range(3)) == "(0,2,4)"
+    assert jsonurl.dumps(array("i", [1, 2])) == "(1,2)"
+    assert jsonurl.dumps(MappingProxyType({"a": iter([1])})) == "(a:(1))"
+    assert jsonurl.dumps(OrderedDict(b=1, a=2), sort_keys=True) == "(a:2,b:1)"
+    assert jsonurl.dumps(iter([]), distinguish_empty_list_dict=True) == "()"
+    assert jsonurl.dumps(MappingProxyType({}), distinguish_empty_list_dict=True) == (
+        "(:)"
+    )
+    assert jsonurl.dumps((x for x in "ab"), implied_list=True) == "a,b"
+    assert jsonurl.dumps((x for x in "ab"), max_length=5) == "(a,b)"
+    assert jsonurl.encoded_length(range(3)) == 7
+    with pytest.raises(TypeError):
+        jsonurl.dumps(b"ab")
+
+
+def _dump_all_ways(data, **kw):
+    opts = jsonurl.DumpOpts(**kw)
+    yield lambda: jsonurl.dumps(data, opts)
+    yield lambda: jsonurl.dumps(data, jsonurl.DumpOpts(max_length=100, **kw))
+    yield lambda: "".join(jsonurl.iterdumps(data, opts))
+    yield lambda: jsonurl.compile_template(data, opts)()
+    yield lambda: jsonurl.encoded_length(data, opts)
+
+
+@pytest.mark.parametrize("data", [{(1, 2): 3}, {"a": {frozenset(): 1}}, [{("x",): 1}]])
+def test_dump_bad_keys(data):
+    for dump in _dump_all_ways(data):
+        with pytest.raises(TypeError, match="Bad key"):
+            dump()
+
+
+def test_dump_sets():
+    data = {"a": {"c", "b", 1}, "b": [frozenset({2.5, "x"})]}
+    for dump in _dump_all_ways(data):
+        with pytest.raises(TypeError, match="sort_keys"):
+            dump()
+    expected = "(a:(1,b,c),b:((2.5,x)))"
+    for dump in _dump_all_ways(data, sort_keys=True):
+        assert dump() in (expected, len(expected))
+    assert jsonurl.dumps({3, 1, 2}, sort_keys=True, implied_list=True) == "1,2,3"
+    assert jsonurl.dumps({1: None, None: 1, 2.5: True}) == "(1:null,null:1,2.5:true)"
+
+
+@pytest.mark.parametrize(
+    "kw", [{}, {"aqf": True}, {"distinguish_empty_list_dict": True}]
+)
+def test_iterdumps(kw):
+    data = {"a": [1, {}, "x y"], "b": {"c": []}, "d": ()}
+    opts = jsonurl.DumpOpts(**kw)
+    assert "".join(jsonurl.iterdumps(data, opts)) == jsonurl.dumps(data, opts)
+    rows = ({"id": i} for i in range(3))
+    pieces = list(jsonurl.iterdumps(rows, opts))
+    assert pieces == ["(", "(id:0)", ",(id:1)", ",(id:2)", ")"]
+    pieces = list(jsonurl.iterdumps({"a": iter([1, 2])}, implied_dict=True))
+    assert pieces == ["a:(", "1", ",2", ")"]
+    assert "".join(jsonurl.iterdumps("x")) == "x"
+    with pytest.raises(ValueError):
+        jsonurl.iterdumps([], jsonurl.DumpOpts(max_length=5))
+
+
+@pytest.mark.parametrize("aqf", [False, True])
+@pytest.mark.parametrize(
+    "data",
+    [
+        list(range(-4, 8)),
+        [0.5, 1e100, -2.0] * 4,
+        [1, 2.5] * 4,
+        [True, False] * 4,
+        ["tag", "a.b", "_x~", "nullx", "-a"] * 2,
+        ["a"] * 8 + ["true"],
+        ["null"] + ["a"] * 8,
+        ["a"] * 8 + [""],
+        ["a"] * 8 + ["a,b"],
+        ["a"] * 8 + ["12"],
+        ["a"] * 8 + ["a b"],
+        ("x",) * 8,
+    ],
+)
+def test_dump_homogeneous(data, aqf: bool):
+    opts = jsonurl.DumpOpts(aqf=aqf)
+    expected = "(" + ",".join(jsonurl.dumps(x, opts) for x in data) + ")"
+    assert jsonurl.dumps(data, opts) == expected
+    assert jsonurl.loads(expected, aqf=aqf) == list(data)
+
+
+def test_dump_homogeneous_array():
+    from array import array
+
+    assert jsonurl.dumps(array("q", [1, -2])) == "(1,-2)"
+    assert jsonurl.dumps(array("d", [0.5])) == "(0.5)"
+    assert jsonurl.dumps(array("u", "ab")) == "(a,b)"
+    assert jsonurl.dumps(range(2, 5), implied_list=True) == "2,3,4"
+
+
+@pytest.mark.parametrize(
+    "kw",
+    [
+        {},
+        {"aqf": True},
+        {"implied_dict": True},
+        {"sort_keys": True, "distinguish_empty_list_dict": True},
+    ],
+)
+def test_compile_template(kw):
+    shape = {
+        "filter": {"status": jsonurl.Slot("status"), "owner": jsonurl.Slot("owner")},
+        "page": jsonurl.Slot("page"),
+        "empty": {},
+        "const": ["a b", 1, None],
+    }
+    template = jsonurl.compile_template(shape, **kw)
+    assert sorted(template.slots) == ["owner", "page", "status"]
+    cases: List[Dict[str, Any]] = [
+        {"status": "open", "owner": "a,b", "page": 3},
+        {"status": "true", "owner": [1, {"x": ""}], "page": {}},
+    ]
+    for values in cases:
+        data = dict(shape, filter=dict(status=values["status"], owner=values["owner"]))
+        data["page"] = values["page"]
+        assert template(**values) == jsonurl.dumps(data, **kw)
+
+
+def test_compile_template_errors():
+    template = jsonurl.compile_template(
+        [jsonurl.Slot("a"), jsonurl.Slot("a")], implied_list=True, max_length=5
+    )
+    assert template.slots == ("a",)
+    assert template(a="xy") == "xy,xy"
+    with pytest.raises(jsonurl.MaxLengthError):
+        template(a="xyz")
+    with pytest.raises(TypeError, match="Missing value for slot 'a'"):
+        template()
+    with pytest.raises(TypeError, match="Unknown slots"):
+        template(a=1, b=2)
+    with pytest.raises(TypeError):
+        jsonurl.compile_template({jsonurl.Slot("a"): 1})
+
+
+def test_loads_dedup():
+    text = "(a:(x:(1,2),y:(1,2)),b:(x:(1,2),y:(1,2)),c:(),d:(),e:(1,(2)),f:(1,2))"
+    ret = jsonurl.loads(text, dedup=True)
+    assert ret == jsonurl.loads(text, frozen=True)
+    assert ret["a"] is ret["b"]
+    assert ret["a"]["x"] is ret["b"]["y"] is ret["f"]
+    assert ret["c"] is ret["d"]
+    assert ret["e"] != ret["f"]
+    ret = jsonurl.loads("(1,2),(1,2)", implied_list=True, dedup=True)
+    assert ret == ((1, 2), (1, 2))
+    assert ret[0] is ret[1]
+    ret = jsonurl.loads("(a!,b),(a!,b)", implied_list=True, dedup=True, aqf=True)
+    assert ret[0] is ret[1]
+
+
+@pytest.mark.skipif(
+    jsonurl.COMPILED or sys.implementation.name == "pypy",
+    reason="Python frames only count towards the recursion limit on CPython",
+)
+def test_loads_dedup_nesting():
+    """dedup must not use more stack per nesting level than plain loads"""
+    depth = len(inspect.stack(0))
+    limit = sys.getrecursionlimit()
+    # nested lists take two frames per level
+    sys.setrecursionlimit(depth + 200)
+    try:
+        for dedup in [False, True]:
+            jsonurl.loads("(" * 90 + ")" * 90, dedup=dedup)
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+@pytest.mark.skipif(jsonurl.COMPILED, reason="hash can't be patched when compiled")
+def test_loads_dedup_hash_collision(monkeypatch):
+    monkeypatch.setattr(jsonurl, "hash", lambda text: 0, raising=False)
+    ret = jsonurl.loads("((1),(2),(1))", dedup=True)
+    assert ret == ((1,), (2,), (1,))
+    assert ret[0] is ret[2]
+
+
+@pytest.mark.parametrize(
+    "arg, expected, expected_aqf",
+    [
+        ("it's", "it's", "it's"),
+        ("'x", "%27x", "'x"),
+        ("x:y", "x%3Ay", "x!:y"),
+        ("f(a,b)", "'f(a,b)'", "f!(a!,b!)"),
+        ("f('a')", "f%28'a'%29", "f!('a'!)"),
+        ("a b:(c)", "'a+b:(c)'", "a+b!:!(c!)"),
+        ("true", "'true'", "!true"),
+        ("", "''", "!e"),
+    ],
+)
+def test_dump_minimize(arg: str, expected: str, expected_aqf: str):
+    assert jsonurl.dumps(arg, minimize=True) == expected
+    assert jsonurl.dumps(arg, minimize=True, aqf=True) == expected_aqf
+    assert jsonurl.loads(expected) == arg
+    assert jsonurl.loads(expected_aqf, aqf=True) == arg
+    jsonurl.validate(expected)
+    jsonurl.validate(expected_aqf, aqf=True)
+
+
+@pytest.mark.parametrize("aqf", [False, True])
+def test_dump_minimize_roundtrip(aqf: bool):
+    data = [" spa ce ", "'quo'te'", ",com,ma,", "(par)(en)", "a:b", "a!b", "true"]
+    data += [x + "'" + y for x in "(,:'" for y in "),'"]
+    text = jsonurl.dumps(data, minimize=True, aqf=aqf)
+    assert len(text) < len(jsonurl.dumps(data, aqf=aqf))
+    assert jsonurl.encoded_length(data, minimize=True, aqf=aqf) == len(text)
+    assert jsonurl.loads(text, aqf=aqf) == data
@@ -16,3 +16,50 @@ def test(index: int):
     dump = jsonurl.dumps(text)
     text_load = jsonurl.loads(dump)
     assert text_load == text
+
+
+@pytest.mark.parametrize("aqf", [False, True])
+@pytest.mark.parametrize("index", range(len(lines)))
+def test_iri(index: int, aqf: bool):
+    text = lines[index]
+    dump = jsonurl.dumps(text, iri=True, aqf=aqf)
+    assert len(dump) * 2 < len(jsonurl.dumps(text, aqf=aqf))
+    assert jsonurl.loads(dump, iri=True, aqf=aqf) == text
+    jsonurl.validate(dump, iri=True, aqf=aqf)
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.loads(dump, aqf=aqf)
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.validate(dump, aqf=aqf)
+
+
+@pytest.mark.parametrize(
+    "text, dump",
+    [
+        ("\U0001f600", "\U0001f600"),
+        # C1 control and noncharacter are not allowed in IRIs
+        ("a\x85b", "a%C2%85b"),
+        ("a\ufdd0b", "a%EF%B7%90b"),
+        ("\U0010fffd", "%F4%8F%BF%BD"),
+        ("\u6211,\u6211", "\u6211%2C\u6211"),
+        ("'\u6211'", "%27\u6211%27"),
+    ],
+)
+def test_iri_chars(text: str, dump: str):
+    assert jsonurl.dumps(text, iri=True) == dump
+    assert jsonurl.loads(dump, iri=True) == text
+    with pytest.raises(jsonurl.ParseError):
+        jsonurl.loads("a\x85b", iri=True)
+
+
+def test_iri_other_parsers():
+    data = {"\u6211": ["\u80fd \u541e", "Я, могу"], "k": "'\u6211'"}
+    for aqf in [False, True]:
+        text = jsonurl.dumps(data, iri=True, aqf=aqf)
+        opts = jsonurl.LoadOpts(iri=True, aqf=aqf)
+        assert jsonurl.loads_tape(text, opts).to_python() == data
+        assert jsonurl.loads_lazy(text, opts)["\u6211"][1] == "Я, могу"
+        assert jsonurl.canonicalize(text, opts) == jsonurl.dumps(
+            data, iri=True, aqf=aqf, sort_keys=True
+        )
+    assert jsonurl.loads("('\u6211,\u80fd')", iri=True) == ["\u6211,\u80fd"]
+    assert jsonurl.loads("%E6%88%91", iri=True) == "\u6211"
@@ -0,0 +1,41 @@
+"""
+Optional build of jsonurl_py compiled with mypyc
+
+The regular build is pure Python via flit, see pyproject.toml. This builds a
+platform wheel with the module compiled by mypyc. Publishing it next to the pure
+Python wheel means pip falls back to pure Python where no compiled wheel
+matches::
+
+    pip install mypy setuptools wheel
+    python setup_mypyc.py bdist_wheel
+
+Use ``build_ext --inplace`` to run tests or benchmarks against the compiled
+module. The extension shadows jsonurl_py.py until it is removed, check
+``jsonurl_py.COMPILED`` to see which one is imported.
+"""
+
+import ast
+from pathlib import Path
+
+from mypyc.build import mypycify
+from setuptools import setup
+
+source = Path(__file__).with_name("jsonurl_py.py").read_text(encoding="utf-8")
+module = ast.parse(source)
+version = next(
+    node.value.value
+    for node in module.body
+    if isinstance(node, ast.Assign)
+    and isinstance(node.targets[0], ast.Name)
+    and node.targets[0].id == "__version__"
+    and isinstance(node.value, ast.Constant)
+)
+
+setup(
+    version=version,
+    description=(ast.get_docstring(module) or "").strip().splitlines()[0],
+    py_modules=["jsonurl_py"],
+    # the compiled module calls mypyc_attr on import
+    install_requires=["mypy_extensions"],
+    ext_modules=mypycify(["jsonurl_py.py"]),
+)